@@ -0,0 +1,5 @@
+'''Helper modules used by ``analysis_notebook.ipynb``.
+
+The modules are imported individually, for instance
+``import escapetools.libfracsurvive``.
+'''
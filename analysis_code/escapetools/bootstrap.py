@@ -0,0 +1,141 @@
+'''Bootstrap confidence intervals for the mutation fraction surviving.
+
+The fraction surviving of each mutation is a ratio of counts, so at low
+counts it is dominated by sampling noise. To estimate this noise, the codon
+counts of the selected and mock samples are resampled many times, either
+with independent Poisson draws for every site and codon or with a
+multinomial draw at each site that keeps the depth fixed. All resamples of
+a chunk are drawn in one call over the whole `(site, codon)` array, and the
+fraction surviving is computed for all of them at once with
+``escapetools.countarrays``. The counts of the error control are not
+resampled.
+
+Chunks of resamples are spread over a pool of processes. Each chunk gets its
+own random seed spawned from *seed* and the position of the sample in the
+batch, so the results do not depend on the number of processes.
+'''
+
+
+import os
+import concurrent.futures
+
+import numpy
+
+from escapetools.countarrays import (errorCorrect, aaCounts, fracSurvive,
+        computeFracSurvive, mutFracSurviveFrame, PSEUDOCOUNT, CHARACTERS, AAS)
+
+RESAMPLING_METHODS = ['poisson', 'multinomial']
+
+
+def resampleCounts(counts, nboot, rng, method='poisson'):
+    '''Resamples *counts* of shape `(site, codon)` *nboot* times.
+
+    *rng* is a ``numpy.random.Generator`` and *method* is one of
+    :data:`RESAMPLING_METHODS`. Returns an array of shape
+    `(nboot, site, codon)`.
+    '''
+    if method == 'poisson':
+        return rng.poisson(counts, size=(nboot,) + counts.shape)
+    elif method == 'multinomial':
+        depth = counts.sum(axis=-1)
+        p = counts / numpy.maximum(depth, 1)[ : , None]
+        # sites without counts get any valid probabilities
+        p[depth == 0] = 1.0 / counts.shape[-1]
+        return rng.multinomial(depth, p, size=(nboot,) + depth.shape)
+    else:
+        raise ValueError("invalid method {0}".format(method))
+
+
+def _bootstrapChunk(job):
+    '''Fraction surviving of the amino acids for one chunk of resamples.'''
+    (sel, mock, errcounts, wtindex, libfracsurvive, pseudocount, aboveavg,
+            nboot, seed, method) = job
+    rng = numpy.random.default_rng(seed)
+    f = fracSurvive(
+            aaCounts(errorCorrect(resampleCounts(sel, nboot, rng, method),
+                    errcounts, wtindex)),
+            aaCounts(errorCorrect(resampleCounts(mock, nboot, rng, method),
+                    errcounts, wtindex)),
+            libfracsurvive, pseudocount)
+    if aboveavg:
+        f = numpy.maximum(0, f - libfracsurvive)
+    return f[..., [CHARACTERS.index(aa) for aa in AAS]]
+
+
+def bootstrapFracSurvive(codoncounts, sel, mock, err, libfracsurvive,
+        nboot=1000, ci=0.95, method='poisson', seed=1, chunksize=100,
+        pseudocount=PSEUDOCOUNT, aboveavg=False, executor=None):
+    '''Bootstrap interval of the fraction surviving of every mutation.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts``, and *sel*,
+    *mock*, and *err* are sample names in it. Draws *nboot* resamples in
+    chunks of *chunksize*, which are run on *executor* if it is given.
+    *seed* is an integer or a ``numpy.random.SeedSequence``.
+
+    Returns the arrays `(lower, upper)` of shape `(site, amino acid)` with
+    the amino acids in the order of ``escapetools.countarrays.AAS``,
+    giving the central *ci* interval of the resampled values.
+    '''
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+    nchunks = -(-nboot // chunksize)
+    jobs = [(codoncounts[sel], codoncounts[mock], codoncounts[err],
+             codoncounts.wildtypeCodonIndex(), libfracsurvive, pseudocount,
+             aboveavg, min(chunksize, nboot - i * chunksize), chunkseed,
+             method) for i, chunkseed in enumerate(seed.spawn(nchunks))]
+    if executor is None:
+        draws = list(map(_bootstrapChunk, jobs))
+    else:
+        draws = list(executor.map(_bootstrapChunk, jobs))
+    lower, upper = numpy.percentile(numpy.concatenate(draws),
+            [50 * (1 - ci), 50 * (1 + ci)], axis=0)
+    return lower, upper
+
+
+def bootstrapBatch(codoncounts, batch, outdir, nboot=1000, ci=0.95,
+        method='poisson', seed=1, ncpus=1, aboveavg=False,
+        use_existing=False):
+    '''Writes bootstrap intervals for every row of a fracsurvive batch.
+
+    *batch* is the ``fracsurvivebatch`` data frame with the columns *group*,
+    *name*, *sel*, *mock*, *err*, and *libfracsurvive*. For each row, the
+    file ``<group>-<name>_mutfracsurviveci.csv`` is written to *outdir*. It
+    has the columns of the ``*_mutfracsurvive.csv`` files plus
+    *mutfracsurvive_lower* and *mutfracsurvive_upper*. If *use_existing* is
+    `True`, existing files are kept. Other arguments are passed to
+    :func:`bootstrapFracSurvive`, with *ncpus* processes. Returns the list
+    of files.
+    '''
+    rootseed = numpy.random.SeedSequence(seed)
+    rowseeds = rootseed.spawn(len(batch))
+    wtaa = codoncounts.wildtypeAA()
+    files = []
+    executor = concurrent.futures.ProcessPoolExecutor(ncpus) if \
+            ncpus > 1 else None
+    try:
+        for row, rowseed in zip(batch.itertuples(index=False), rowseeds):
+            f = os.path.join(outdir, '{0}-{1}_mutfracsurviveci.csv'.format(
+                    row.group, row.name))
+            files.append(f)
+            if use_existing and os.path.isfile(f):
+                continue
+            point = computeFracSurvive(codoncounts, row.sel, row.mock,
+                    row.err, row.libfracsurvive, aboveavg=aboveavg)
+            lower, upper = bootstrapFracSurvive(codoncounts, row.sel,
+                    row.mock, row.err, row.libfracsurvive, nboot=nboot, ci=ci,
+                    method=method, seed=rowseed, aboveavg=aboveavg,
+                    executor=executor)
+            # place intervals in the character columns of the point estimate
+            iaas = [CHARACTERS.index(aa) for aa in AAS]
+            extracols = {}
+            for col, values in [('mutfracsurvive_lower', lower),
+                                ('mutfracsurvive_upper', upper)]:
+                full = numpy.full(point.shape, numpy.nan)
+                full[..., iaas] = values
+                extracols[col] = full
+            mutFracSurviveFrame(codoncounts.sites, wtaa, point, extracols,
+                    codoncounts.sitekeys).to_csv(f, index=False)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return files
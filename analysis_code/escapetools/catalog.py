@@ -0,0 +1,120 @@
+'''Catalog of the fracsurvive output files for a ``fracsurvivebatch``.
+
+The notebook used to find output files by globbing the results directory.
+A :class:`ResultsCatalog` instead derives every output path from the rows
+of the ``fracsurvivebatch`` data frame passed to ``dms2_batch_fracsurvive``,
+reads each table only when it is first accessed, and keeps recently used
+tables in memory up to a size limit.
+'''
+
+
+import os
+import collections
+
+import pandas
+
+
+class ResultsCatalog(object):
+    '''Output files of ``dms2_batch_fracsurvive`` and the notebook.
+
+    *batch* is the ``fracsurvivebatch`` data frame with the columns
+    *group*, *name*, and *antibody*. *outdir* is the directory passed as
+    ``--outdir`` and *summaryprefix* the value passed as
+    ``--summaryprefix``. Loaded tables are cached until their total memory
+    exceeds *maxbytes*, at which point the least recently used ones are
+    dropped.
+    '''
+
+    def __init__(self, batch, outdir, summaryprefix='summary',
+            maxbytes=500e6):
+        self.batch = batch[['group', 'name', 'antibody']].copy()
+        self.outdir = outdir
+        self.summaryprefix = summaryprefix
+        self.maxbytes = maxbytes
+        self._cache = collections.OrderedDict()
+        self._cachebytes = 0
+
+    def antibodies(self):
+        '''List of antibodies in the batch.'''
+        return list(self.batch['antibody'].unique())
+
+    def groups(self, antibody=None):
+        '''List of groups, optionally only those for *antibody*.'''
+        batch = self.batch
+        if antibody is not None:
+            batch = batch[batch['antibody'] == antibody]
+        return list(batch['group'].unique())
+
+    def replicates(self, group):
+        '''List of replicate names in *group*.'''
+        return list(self.batch.loc[self.batch['group'] == group, 'name'])
+
+    def replicateFile(self, group, name, kind='mut'):
+        '''Per-replicate ``<kind>fracsurvive`` file, *kind* ``mut`` or ``site``.'''
+        return os.path.join(self.outdir, '{0}-{1}_{2}fracsurvive.csv'.format(
+                group, name, kind))
+
+    def groupSummaryFile(self, group, stat='median', kind='mut'):
+        '''Across-replicate *stat* (``median`` or ``mean``) file for *group*.'''
+        return os.path.join(self.outdir, '{0}_{1}-{2}{3}fracsurvive.csv'
+                .format(self.summaryprefix, group, stat, kind))
+
+    def antibodyMedianFile(self, antibody, avgsite=False):
+        '''Across-concentration median file for *antibody* written by the notebook.'''
+        return os.path.join(self.outdir, 'antibody_{0}_median{1}.csv'.format(
+                antibody, '_avgsite' if avgsite else ''))
+
+    def allFiles(self):
+        '''List of every per-replicate, group summary, and antibody file.'''
+        files = []
+        for group, name in self.batch[['group', 'name']].itertuples(
+                index=False):
+            files += [self.replicateFile(group, name, kind)
+                      for kind in ['mut', 'site']]
+        for group in self.groups():
+            files += [self.groupSummaryFile(group, stat, kind)
+                      for stat in ['median', 'mean'] for kind in ['mut', 'site']]
+        for antibody in self.antibodies():
+            files += [self.antibodyMedianFile(antibody, avgsite)
+                      for avgsite in [False, True]]
+        return files
+
+    def load(self, path):
+        '''Data frame for the CSV *path*, read on first access and cached.'''
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self._cache[path]
+        df = pandas.read_csv(path)
+        self._cache[path] = df
+        self._cachebytes += df.memory_usage(deep=True).sum()
+        while self._cachebytes > self.maxbytes and len(self._cache) > 1:
+            _, dropped = self._cache.popitem(last=False)
+            self._cachebytes -= dropped.memory_usage(deep=True).sum()
+        return df
+
+    def replicate(self, group, name, kind='mut'):
+        '''Per-replicate fracsurvive data frame.'''
+        return self.load(self.replicateFile(group, name, kind))
+
+    def groupSummary(self, group, stat='median', kind='mut'):
+        '''Across-replicate summary data frame for *group*.'''
+        return self.load(self.groupSummaryFile(group, stat, kind))
+
+    def antibodyMedian(self, antibody, avgsite=False):
+        '''Across-concentration median data frame for *antibody*.'''
+        return self.load(self.antibodyMedianFile(antibody, avgsite))
+
+    def iterGroupSummaries(self, antibody=None, stat='median', kind='mut'):
+        '''Yields `(group, data frame)` for each group (of *antibody*).'''
+        for group in self.groups(antibody):
+            yield group, self.groupSummary(group, stat, kind)
+
+    def iterReplicates(self, group=None, antibody=None, kind='mut'):
+        '''Yields `(group, name, data frame)` for the matching replicates.'''
+        batch = self.batch
+        if group is not None:
+            batch = batch[batch['group'] == group]
+        if antibody is not None:
+            batch = batch[batch['antibody'] == antibody]
+        for g, name in batch[['group', 'name']].itertuples(index=False):
+            yield g, name, self.replicate(g, name, kind)
@@ -0,0 +1,202 @@
+'''Predicted escape from cocktails of antibodies.
+
+If the antibodies in a cocktail act independently, the fraction of virions
+with a mutation that survive the cocktail is the product of the fractions
+surviving each antibody. A :class:`CocktailPredictor` holds the median
+mutation fraction surviving (not above average) of each antibody as one
+`(antibody, mutation)` array of logarithms, so the predicted fraction
+surviving of every single mutant for a chunk of cocktails is a sum of rows
+of this array. Cocktails of *k* antibodies are enumerated in chunks whose
+size is set by a memory limit, and the rows of each chunk are gathered
+into two reused `(cocktail, mutation)` buffers, so the working memory does
+not grow with *k*.
+
+For double mutants, the effects of the two mutations on each antibody are
+taken to be multiplicative relative to a neutral mutation, so the fraction
+surviving antibody :math:`a` is
+:math:`\\min(1, F_{a,m_1} F_{a,m_2} / \\bar{F}_a)` where :math:`\\bar{F}_a`
+is the median over mutations. Only pairs of the strongest escape mutations
+at different sites are considered.
+'''
+
+
+import itertools
+
+import numpy
+import pandas
+
+from escapetools.countarrays import AAS
+from escapetools.sites import siteKeys
+from escapetools.filenames import medianFileAntibodies
+
+
+def _ncombinations(n, k):
+    '''Number of combinations of *k* of *n* items.'''
+    count = 1
+    for i in range(k):
+        count = count * (n - i) // (i + 1)
+    return count
+
+
+def _chunks(iterable, n):
+    '''Yields lists of up to *n* items of *iterable*.'''
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CocktailPredictor(object):
+    '''Predicts the fraction surviving cocktails of antibodies.
+
+    *tables* is a dict keyed by antibody of data frames with the columns
+    *site*, *wildtype*, *mutation*, and *mutfracsurvive*. Mutations to the
+    wildtype identity or to stop codons are ignored. A mutation missing for
+    an antibody is given that antibody's median. Values are clipped to be at
+    least *minfracsurvive* before taking logarithms.
+    '''
+
+    def __init__(self, tables, minfracsurvive=1e-6):
+        self.antibodies = list(tables)
+        tables = dict((ab, df[(df['mutation'] != df['wildtype']) &
+                df['mutation'].isin(AAS)]) for ab, df in tables.items())
+        # integer code of each mutation from its site key and amino acid
+        codes = {}
+        for ab, df in tables.items():
+            codes[ab] = (siteKeys(df['site']) * len(AAS) +
+                         pandas.Index(AAS).get_indexer(df['mutation']))
+        allcodes = pandas.Index(numpy.unique(numpy.concatenate(
+                list(codes.values()))))
+        self.mutations = (pandas.concat(tables.values())
+                          .assign(code=numpy.concatenate(list(codes.values())))
+                          .drop_duplicates('code')
+                          .set_index('code')
+                          .loc[allcodes, ['site', 'wildtype', 'mutation']]
+                          .reset_index(drop=True)
+                          )
+        self.mutations['site'] = self.mutations['site'].astype(str)
+        fracsurvive = numpy.full((len(self.antibodies), len(allcodes)),
+                numpy.nan)
+        for i, ab in enumerate(self.antibodies):
+            fracsurvive[i, allcodes.get_indexer(codes[ab])] = \
+                    tables[ab]['mutfracsurvive'].values
+        medians = numpy.nanmedian(fracsurvive, axis=1)
+        fracsurvive = numpy.where(numpy.isnan(fracsurvive), medians[ : , None],
+                fracsurvive)
+        self.logfracsurvive = numpy.log(numpy.clip(fracsurvive,
+                minfracsurvive, 1))
+        self.logmedian = numpy.log(numpy.clip(medians, minfracsurvive, 1))
+
+    @classmethod
+    def fromFiles(cls, medianfiles, **kwargs):
+        '''Predictor from ``antibody_<Ab>_median.csv`` files.'''
+        return cls(dict((ab, pandas.read_csv(f)) for ab, f in
+                zip(medianFileAntibodies(medianfiles), medianfiles)), **kwargs)
+
+    def _chunksize(self, k, ncols, maxbytes):
+        # two float64 buffers of shape (chunk, ncols) per chunk
+        return max(1, min(_ncombinations(len(self.antibodies), k),
+                          int(maxbytes // (2 * 8 * max(ncols, 1)))))
+
+    @staticmethod
+    def _sumRows(values, combos, out, buf):
+        '''Sums the rows *combos* of *values* into *out*, gathering into *buf*.'''
+        # mode='clip' writes straight into out, whereas the default buffers
+        numpy.take(values, combos[ : , 0], axis=0, out=out, mode='clip')
+        for j in range(1, combos.shape[1]):
+            numpy.take(values, combos[ : , j], axis=0, out=buf, mode='clip')
+            out += buf
+        return out
+
+    def singles(self, k, maxbytes=2e8):
+        '''Predicted escape of single mutants from all cocktails of *k* antibodies.
+
+        Returns a data frame with one row per cocktail giving the
+        *cocktail* (antibodies joined by ``+``), the *site*, *wildtype*, and
+        *mutation* of the single mutant with the highest predicted fraction
+        surviving, that *maxfracsurvive*, and the *meanfracsurvive* over all
+        single mutants. Sorted by decreasing *maxfracsurvive*. The arrays
+        for each chunk of cocktails take at most about *maxbytes*.
+        '''
+        results = []
+        nmut = len(self.mutations)
+        chunksize = self._chunksize(k, nmut, maxbytes)
+        out = numpy.empty((chunksize, nmut))
+        buf = numpy.empty((chunksize, nmut))
+        for chunk in _chunks(itertools.combinations(
+                range(len(self.antibodies)), k), chunksize):
+            combos = numpy.array(chunk, dtype=int)
+            n = len(combos)
+            logf = self._sumRows(self.logfracsurvive, combos, out[ : n],
+                    buf[ : n])
+            best = logf.argmax(axis=1)
+            maxfracsurvive = numpy.exp(logf[numpy.arange(n), best])
+            numpy.exp(logf, out=logf)
+            results.append(pandas.DataFrame({
+                    'cocktail':['+'.join(self.antibodies[i] for i in c)
+                                for c in combos],
+                    'imut':best,
+                    'maxfracsurvive':maxfracsurvive,
+                    'meanfracsurvive':logf.mean(axis=1),
+                    }))
+        df = pandas.concat(results, ignore_index=True)
+        df = pandas.concat([df.drop(columns='imut'),
+                self.mutations.iloc[df['imut']].reset_index(drop=True)], axis=1)
+        return (df[['cocktail', 'site', 'wildtype', 'mutation',
+                    'maxfracsurvive', 'meanfracsurvive']]
+                .sort_values('maxfracsurvive', ascending=False,
+                             kind='mergesort')
+                .reset_index(drop=True)
+                )
+
+    def doubles(self, k, ncandidates=100, maxbytes=2e8):
+        '''Predicted escape of double mutants from all cocktails of *k* antibodies.
+
+        Double mutants are pairs at different sites of the *ncandidates*
+        mutations with the highest fraction surviving of any antibody.
+        Returns a data frame with one row per cocktail giving the
+        *cocktail*, the two mutations (*mutation1* and *mutation2*, as
+        ``<wildtype><site><mutation>``) of the double mutant with the
+        highest predicted fraction surviving, and that *maxfracsurvive*.
+        Sorted by decreasing *maxfracsurvive*. The arrays for each chunk of
+        cocktails take at most about *maxbytes*, besides one
+        `(antibody, pair)` array for all of the pairs.
+        '''
+        candidates = numpy.argsort(-self.logfracsurvive.max(axis=0),
+                kind='mergesort')[ : ncandidates]
+        sites = self.mutations['site'].values[candidates]
+        i1, i2 = numpy.triu_indices(len(candidates), k=1)
+        keep = sites[i1] != sites[i2]
+        i1, i2 = i1[keep], i2[keep]
+        # log fraction surviving each antibody, shape (antibody, pair)
+        # numpy.take keeps the rows contiguous, so they are gathered in place
+        logpairs = numpy.take(self.logfracsurvive, candidates[i1], axis=1)
+        logpairs += numpy.take(self.logfracsurvive, candidates[i2], axis=1)
+        logpairs -= self.logmedian[ : , None]
+        numpy.minimum(logpairs, 0, out=logpairs)
+        names = (self.mutations['wildtype'] + self.mutations['site'] +
+                 self.mutations['mutation']).values[candidates]
+        results = []
+        chunksize = self._chunksize(k, len(i1), maxbytes)
+        out = numpy.empty((chunksize, len(i1)))
+        buf = numpy.empty((chunksize, len(i1)))
+        for chunk in _chunks(itertools.combinations(
+                range(len(self.antibodies)), k), chunksize):
+            combos = numpy.array(chunk, dtype=int)
+            n = len(combos)
+            logf = self._sumRows(logpairs, combos, out[ : n], buf[ : n])
+            best = logf.argmax(axis=1)
+            results.append(pandas.DataFrame({
+                    'cocktail':['+'.join(self.antibodies[i] for i in c)
+                                for c in combos],
+                    'mutation1':names[i1[best]],
+                    'mutation2':names[i2[best]],
+                    'maxfracsurvive':numpy.exp(logf[numpy.arange(n), best]),
+                    }))
+        return (pandas.concat(results, ignore_index=True)
+                .sort_values('maxfracsurvive', ascending=False,
+                             kind='mergesort')
+                .reset_index(drop=True)
+                )
@@ -0,0 +1,363 @@
+'''Codon counts as arrays, and the fraction surviving computed from them.
+
+The ``*_codoncounts.csv`` files of all samples are read into a single
+:class:`CodonCounts` array of shape `(sample, site, codon)`, so that the
+counts of any set of samples can be processed together. The functions in
+this module compute the mutation fraction surviving from such arrays in
+the same way as ``dms2_batch_fracsurvive`` with its default amino-acid
+characters and pseudocount, and broadcast over any leading dimensions
+(such as bootstrap replicates or samples).
+
+For a site :math:`r` and amino acid :math:`x`, the counts :math:`n_{r,x}`
+of the selected and mock samples are first corrected for sequencing errors
+using the error rates :math:`\\epsilon_{r,x}` in the error control: the
+wildtype counts are divided by :math:`\\epsilon_{r,\\rm{wt}}` and other
+counts become :math:`\\max(0, n_{r,x} - \\epsilon_{r,x} N_r)`, where
+:math:`N_r` is the depth at the site. This is done on codons, which are
+then summed into amino acids (stop codons included). The fraction surviving
+is then
+
+.. math::
+
+    F_{r,x} = \\gamma \\frac{\\left(n^{\\rm{sel}}_{r,x} + P^{\\rm{sel}}_r\\right) / \\left(N^{\\rm{sel}}_r + A P^{\\rm{sel}}_r\\right)}{\\left(n^{\\rm{mock}}_{r,x} + P^{\\rm{mock}}_r\\right) / \\left(N^{\\rm{mock}}_r + A P^{\\rm{mock}}_r\\right)}
+
+where :math:`\\gamma` is the library fraction surviving, :math:`A` is the
+number of characters, and the pseudocount :math:`P` is added to the
+shallower sample and scaled by the depth ratio for the deeper one.
+'''
+
+
+import os
+import glob
+import hashlib
+import itertools
+
+import numpy
+import pandas
+
+from escapetools.filenames import parseCodonCountsFile
+from escapetools.sites import siteKeys
+
+#: codons in the column order of the codon counts files
+CODONS = [''.join(c) for c in itertools.product('ACGT', repeat=3)]
+
+#: the standard genetic code
+CODON_TO_AA = dict(zip([''.join(c) for c in itertools.product('TCAG',
+        repeat=3)], 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'))
+
+#: characters of amino-acid counts, the stop codon ``*`` first
+CHARACTERS = sorted(set(CODON_TO_AA.values()))
+
+#: amino acids for which the mutation fraction surviving is reported
+AAS = [c for c in CHARACTERS if c != '*']
+
+#: `(codon, character)` indicator matrix of translation, rows in the order
+#: of :data:`CODONS` and columns in the order of :data:`CHARACTERS`
+CODON_TO_AA_MATRIX = numpy.array([[int(CODON_TO_AA[codon] == char) for
+        char in CHARACTERS] for codon in CODONS])
+
+#: default pseudocount of ``dms2_batch_fracsurvive``
+PSEUDOCOUNT = 5
+
+
+class CodonCounts(object):
+    '''Codon counts of several samples stacked into one array.
+
+    *samples* is a list of sample names, *sites* and *wildtype* are the
+    site labels and wildtype codons shared by all samples, and *counts* is
+    an array of shape `(len(samples), len(sites), 64)` with codons in the
+    order of :data:`CODONS`. The counts are integers as read from the files,
+    or floats after :meth:`errorCorrected`. The integer keys of the sites
+    (see ``escapetools.sites``) are in *sitekeys*.
+    '''
+
+    def __init__(self, samples, sites, wildtype, counts):
+        self.samples = list(samples)
+        self.sites = numpy.asarray(sites, dtype=str)
+        self.sitekeys = siteKeys(self.sites)
+        self.wildtype = numpy.asarray(wildtype, dtype=str)
+        self.counts = counts
+        self._sampleindex = dict((s, i) for i, s in enumerate(self.samples))
+
+    @classmethod
+    def fromDir(cls, countsdir, samples=None):
+        '''Reads the ``<sample>_codoncounts.csv`` files in *countsdir*.
+
+        By default reads all samples, otherwise only those in the list
+        *samples*. All files must have the same sites and wildtype codons.
+        '''
+        if samples is None:
+            samples = sorted(parseCodonCountsFile(f) for f in
+                    glob.glob(os.path.join(countsdir, '*_codoncounts.csv')))
+        sites = wildtype = None
+        counts = []
+        for sample in samples:
+            f = os.path.join(countsdir, '{0}_codoncounts.csv'.format(sample))
+            df = pandas.read_csv(f, dtype={'site':str})
+            if sites is None:
+                sites = df['site'].values
+                wildtype = df['wildtype'].values
+            elif not (numpy.array_equal(sites, df['site'].values) and
+                    numpy.array_equal(wildtype, df['wildtype'].values)):
+                raise ValueError("sites or wildtype of {0} differ".format(f))
+            counts.append(df[CODONS].values)
+        return cls(samples, sites, wildtype, numpy.stack(counts))
+
+    def save(self, npzfile, **metadata):
+        '''Saves the counts to the numpy ``.npz`` file *npzfile*.
+
+        The keyword arguments *metadata* are saved as well, and are returned
+        by :meth:`load` with `metadata=True`.
+        '''
+        numpy.savez(npzfile, samples=numpy.array(self.samples),
+                sites=self.sites, wildtype=self.wildtype, counts=self.counts,
+                **dict(('meta_' + key, numpy.array(value)) for
+                       key, value in metadata.items()))
+
+    @classmethod
+    def load(cls, npzfile, metadata=False):
+        '''Loads counts saved with :meth:`save`.
+
+        If *metadata* is `True`, returns `(counts, metadata)`.
+        '''
+        with numpy.load(npzfile) as data:
+            counts = cls([str(s) for s in data['samples']], data['sites'],
+                    data['wildtype'], data['counts'])
+            if metadata:
+                return counts, dict((key[len('meta_') : ], data[key].item())
+                        for key in data.files if key.startswith('meta_'))
+        return counts
+
+    def errorCorrected(self, err, cachefile=None, use_existing=False):
+        '''Counts of all samples corrected for errors in the sample *err*.
+
+        All samples are corrected by :func:`errorCorrect` in one broadcast
+        operation. If *cachefile* is given the corrected counts are saved
+        to it along with *err* and the :meth:`checksum` of the uncorrected
+        counts, and if *use_existing* is `True` and *cachefile* was made
+        from the same counts with the same *err*, they are loaded from
+        there instead. Returns a new :class:`CodonCounts` with float counts.
+        '''
+        checksum = self.checksum() if cachefile else None
+        if cachefile and use_existing and os.path.isfile(cachefile):
+            cached, metadata = CodonCounts.load(cachefile, metadata=True)
+            if (metadata.get('err') == err and
+                    metadata.get('checksum') == checksum):
+                return cached
+        corrected = CodonCounts(self.samples, self.sites, self.wildtype,
+                errorCorrect(self.counts, self[err],
+                             self.wildtypeCodonIndex()))
+        if cachefile:
+            corrected.save(cachefile, err=err, checksum=checksum)
+        return corrected
+
+    def checksum(self):
+        '''SHA-1 hex digest identifying the samples, sites, and counts.'''
+        h = hashlib.sha1()
+        for item in [self.samples, list(self.sites), list(self.wildtype)]:
+            h.update(repr(item).encode())
+        h.update(numpy.ascontiguousarray(self.counts).tobytes())
+        return h.hexdigest()
+
+    def aaCounts(self, cachefile=None, use_existing=False):
+        '''Amino-acid counts of all samples, computed by :func:`aaCounts`.
+
+        Returns an array of shape `(sample, site, character)`. If
+        *cachefile* is given the counts are saved to it as a numpy ``.npz``
+        file along with :meth:`checksum`, and if *use_existing* is `True`
+        and *cachefile* was made from the same codon counts they are loaded
+        from there instead.
+        '''
+        checksum = self.checksum() if cachefile else None
+        if cachefile and use_existing and os.path.isfile(cachefile):
+            with numpy.load(cachefile) as data:
+                if data['checksum'].item() == checksum:
+                    return data['aacounts']
+        aacounts = aaCounts(self.counts)
+        if cachefile:
+            numpy.savez(cachefile, aacounts=aacounts,
+                    characters=numpy.array(CHARACTERS),
+                    checksum=numpy.array(checksum))
+        return aacounts
+
+    def index(self, samples):
+        '''Array of the indices of the sample names *samples*.'''
+        return numpy.array([self._sampleindex[s] for s in samples], dtype=int)
+
+    def __getitem__(self, sample):
+        '''Counts of *sample* as an array of shape `(site, codon)`.'''
+        return self.counts[self._sampleindex[sample]]
+
+    def wildtypeCodonIndex(self):
+        '''Index in :data:`CODONS` of the wildtype codon at each site.'''
+        return numpy.array([CODONS.index(c) for c in self.wildtype])
+
+    def wildtypeAA(self):
+        '''Wildtype amino acid (or ``*``) at each site.'''
+        return numpy.array([CODON_TO_AA[c] for c in self.wildtype])
+
+
+def errorRates(errcounts):
+    '''Error rate of each codon at each site from error-control counts.
+
+    *errcounts* has shape `(site, codon)`. The rate of the wildtype codon is
+    the fraction of reads that are correctly wildtype.
+    '''
+    errcounts = numpy.asarray(errcounts, dtype='float')
+    return errcounts / errcounts.sum(axis=-1, keepdims=True)
+
+
+def errorCorrect(counts, errcounts, wtindex):
+    '''Corrects *counts* for the errors in the error control *errcounts*.
+
+    *counts* has shape `(..., site, codon)`, *errcounts* has shape
+    `(site, codon)`, and *wtindex* gives the wildtype codon index at each
+    site. Returns a float array of the same shape as *counts*.
+    '''
+    counts = numpy.asarray(counts, dtype='float')
+    errrates = errorRates(errcounts)
+    depth = counts.sum(axis=-1, keepdims=True)
+    corrected = numpy.maximum(0, counts - errrates * depth)
+    isite = numpy.arange(len(wtindex))
+    corrected[..., isite, wtindex] = (counts[..., isite, wtindex] /
+            errrates[isite, wtindex])
+    return corrected
+
+
+def aaCounts(counts):
+    '''Sums codon *counts* of shape `(..., site, codon)` into amino acids.
+
+    This is a single product with :data:`CODON_TO_AA_MATRIX`. Returns an
+    array of shape `(..., site, character)` with the characters in the
+    order of :data:`CHARACTERS`.
+    '''
+    return numpy.matmul(counts, CODON_TO_AA_MATRIX.astype(
+            numpy.result_type(counts, CODON_TO_AA_MATRIX)))
+
+
+def fracSurvive(sel, mock, libfracsurvive, pseudocount=PSEUDOCOUNT):
+    '''Fraction surviving from amino-acid counts of selected and mock samples.
+
+    *sel* and *mock* have shape `(..., site, character)` and may broadcast
+    against each other, and *libfracsurvive* is a scalar or an array that
+    broadcasts against their leading dimensions. Returns the fraction
+    surviving of every character at every site.
+    '''
+    sel = numpy.asarray(sel, dtype='float')
+    mock = numpy.asarray(mock, dtype='float')
+    nchars = sel.shape[-1]
+    selDepth = sel.sum(axis=-1, keepdims=True)
+    mockDepth = mock.sum(axis=-1, keepdims=True)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        selPseudo = pseudocount * numpy.maximum(1, selDepth / mockDepth)
+        mockPseudo = pseudocount * numpy.maximum(1, mockDepth / selDepth)
+    libfracsurvive = numpy.asarray(libfracsurvive, dtype='float')
+    libfracsurvive = libfracsurvive.reshape(libfracsurvive.shape + (1, 1))
+    return libfracsurvive * (
+            ((sel + selPseudo) / (selDepth + nchars * selPseudo)) /
+            ((mock + mockPseudo) / (mockDepth + nchars * mockPseudo)))
+
+
+def computeFracSurvive(codoncounts, sel, mock, err, libfracsurvive,
+        pseudocount=PSEUDOCOUNT, aboveavg=False):
+    '''Fraction surviving for samples in the :class:`CodonCounts` *codoncounts*.
+
+    *sel*, *mock*, and *err* are sample names. Set *err* to `None` if
+    *codoncounts* is already corrected by :meth:`CodonCounts.errorCorrected`.
+    If *aboveavg* is `True`, returns the fraction surviving above the
+    library average, :math:`\\max(0, F_{r,x} - \\gamma)`. Returns an array
+    of shape `(site, character)`.
+    '''
+    sel = codoncounts[sel]
+    mock = codoncounts[mock]
+    if err is not None:
+        wtindex = codoncounts.wildtypeCodonIndex()
+        sel = errorCorrect(sel, codoncounts[err], wtindex)
+        mock = errorCorrect(mock, codoncounts[err], wtindex)
+    f = fracSurvive(aaCounts(sel), aaCounts(mock), libfracsurvive,
+            pseudocount)
+    if aboveavg:
+        f = numpy.maximum(0, f - libfracsurvive)
+    return f
+
+
+def codingSites(wildtype):
+    '''Boolean mask of the sites whose *wildtype* is not a stop codon.'''
+    return numpy.asarray(wildtype) != '*'
+
+
+def mutFracSurviveFrame(sites, wildtype, fracsurvive, extracols=None,
+        sitekeys=None):
+    '''Data frame like the ``*_mutfracsurvive.csv`` files.
+
+    *sites* and *wildtype* give the site labels and wildtype amino acids,
+    and *fracsurvive* is an array of shape `(site, character)`. Stop codon
+    mutations and sites with a wildtype stop codon are dropped, as by
+    ``dms2_batch_fracsurvive``. *extracols* is an optional dict of
+    additional columns, each an array shaped like *fracsurvive*. The
+    *sitekey* column holds *sitekeys* (such as `CodonCounts.sitekeys`), or
+    the keys of *sites* if `None`. Rows are sorted by decreasing
+    *mutfracsurvive*.
+    '''
+    iaas = [CHARACTERS.index(aa) for aa in AAS]
+    keep = codingSites(wildtype)
+    if sitekeys is None:
+        sitekeys = siteKeys(sites)
+    sites = numpy.asarray(sites)[keep]
+    columns = [('site', numpy.repeat(sites, len(AAS))),
+               ('sitekey', numpy.repeat(numpy.asarray(sitekeys)[keep],
+                                        len(AAS))),
+               ('wildtype', numpy.repeat(numpy.asarray(wildtype)[keep],
+                                         len(AAS))),
+               ('mutation', numpy.tile(AAS, len(sites))),
+               ('mutfracsurvive', fracsurvive[keep][..., iaas].ravel()),
+               ]
+    for col, values in (extracols or {}).items():
+        columns.append((col, values[keep][..., iaas].ravel()))
+    return (pandas.DataFrame(dict(columns))
+            .sort_values('mutfracsurvive', ascending=False, kind='mergesort')
+            .reset_index(drop=True)
+            )
+
+
+def avgFracSurvive(fracsurvive, wildtype):
+    '''Mean fraction surviving over the non-wildtype amino acids of each site.
+
+    *fracsurvive* has shape `(..., site, character)` and *wildtype* gives
+    the wildtype amino acid of each site. Returns an array of shape
+    `(..., site)`.
+    '''
+    iaas = [CHARACTERS.index(aa) for aa in AAS]
+    nonwt = numpy.array(AAS)[None, : ] != numpy.asarray(wildtype)[ : , None]
+    return (numpy.where(nonwt, fracsurvive[..., iaas], 0).sum(axis=-1) /
+            nonwt.sum(axis=-1))
+
+
+def siteFracSurviveFrame(sites, wildtype, fracsurvive, sitekeys=None):
+    '''Data frame like the ``*_sitefracsurvive.csv`` files.
+
+    The *avgfracsurvive* and *maxfracsurvive* of a site are the mean and
+    maximum over all non-wildtype amino acids. Sites with a wildtype stop
+    codon are dropped. The *sitekey* column is as for
+    :func:`mutFracSurviveFrame`. Rows are sorted by decreasing
+    *avgfracsurvive*.
+    '''
+    keep = codingSites(wildtype)
+    if sitekeys is None:
+        sitekeys = siteKeys(sites)
+    sitekeys = numpy.asarray(sitekeys)[keep]
+    sites = numpy.asarray(sites)[keep]
+    wildtype = numpy.asarray(wildtype)[keep]
+    fracsurvive = fracsurvive[keep]
+    iaas = [CHARACTERS.index(aa) for aa in AAS]
+    f = fracsurvive[..., iaas]
+    nonwt = numpy.array(AAS)[None, : ] != wildtype[ : , None]
+    return (pandas.DataFrame({
+                'site':sites,
+                'sitekey':sitekeys,
+                'avgfracsurvive':avgFracSurvive(fracsurvive, wildtype),
+                'maxfracsurvive':numpy.where(nonwt, f, -numpy.inf).max(axis=-1),
+                })
+            .sort_values('avgfracsurvive', ascending=False, kind='mergesort')
+            .reset_index(drop=True)
+            )
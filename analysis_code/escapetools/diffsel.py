@@ -0,0 +1,174 @@
+'''Differential selection computed from stacked amino-acid counts.
+
+The notebook computes the fraction surviving with ``dms2_batch_fracsurvive``,
+and differential selection used to need a separate ``dms2_batch_diffsel``
+run that read all counts files again. Here the differential selection of
+every row of ``fracsurvivebatch`` is computed from the error-corrected
+amino-acid counts of all samples that are already in memory (see
+``escapetools.countarrays.CodonCounts.aaCounts``), and written to the same
+files as ``dms2_batch_diffsel``.
+
+As in ``dms_tools2.diffsel``, the differential selection of amino acid
+:math:`x` at site :math:`r` is
+
+.. math::
+
+    s_{r,x} = \\log_2 \\frac{\\left(n^{\\rm{sel}}_{r,x} + f^{\\rm{sel}}_r P\\right) / \\left(n^{\\rm{sel}}_{r,\\rm{wt}} + f^{\\rm{sel}}_r P\\right)}{\\left(n^{\\rm{mock}}_{r,x} + f^{\\rm{mock}}_r P\\right) / \\left(n^{\\rm{mock}}_{r,\\rm{wt}} + f^{\\rm{mock}}_r P\\right)}
+
+where :math:`f^{\\rm{sel}}_r = \\max(1, N^{\\rm{sel}}_r / N^{\\rm{mock}}_r)`
+and :math:`f^{\\rm{mock}}_r = \\max(1, N^{\\rm{mock}}_r / N^{\\rm{sel}}_r)`
+scale the pseudocount :math:`P` by the ratio of depths.
+'''
+
+
+import os
+
+import numpy
+import pandas
+
+from escapetools.countarrays import codingSites, CHARACTERS, AAS, PSEUDOCOUNT
+from escapetools.sites import siteKeys
+
+
+def mutDiffSel(sel, mock, wtindex, pseudocount=PSEUDOCOUNT):
+    '''Differential selection from amino-acid counts.
+
+    *sel* and *mock* have shape `(..., site, character)` and may broadcast
+    against each other, and *wtindex* gives the index of the wildtype
+    character at each site. Returns an array of the same shape, which is
+    zero for the wildtype character.
+    '''
+    sel = numpy.asarray(sel, dtype='float')
+    mock = numpy.asarray(mock, dtype='float')
+    selDepth = sel.sum(axis=-1, keepdims=True)
+    mockDepth = mock.sum(axis=-1, keepdims=True)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        selPseudo = pseudocount * numpy.maximum(1, selDepth / mockDepth)
+        mockPseudo = pseudocount * numpy.maximum(1, mockDepth / selDepth)
+    isite = numpy.arange(len(wtindex))
+    sel = sel + selPseudo
+    mock = mock + mockPseudo
+    return numpy.log2((sel / sel[..., isite, wtindex][..., None]) /
+                      (mock / mock[..., isite, wtindex][..., None]))
+
+
+def mutDiffSelFrame(sites, wildtype, diffsel, includestop=True,
+        sitekeys=None):
+    '''Data frame like the ``*_mutdiffsel.csv`` files.
+
+    *sites* and *wildtype* give the site labels and wildtype characters,
+    and *diffsel* is an array of shape `(site, character)`. Stop codon
+    mutations are included if *includestop* is `True`. Sites with a
+    wildtype stop codon are dropped. The *sitekey* column holds *sitekeys*,
+    or the keys of *sites* if `None`. Rows are sorted by decreasing
+    *mutdiffsel*.
+    '''
+    chars = CHARACTERS if includestop else AAS
+    ichars = [CHARACTERS.index(c) for c in chars]
+    keep = codingSites(wildtype)
+    if sitekeys is None:
+        sitekeys = siteKeys(sites)
+    sites = numpy.asarray(sites)[keep]
+    return (pandas.DataFrame({
+                'site':numpy.repeat(sites, len(chars)),
+                'sitekey':numpy.repeat(numpy.asarray(sitekeys)[keep],
+                                       len(chars)),
+                'wildtype':numpy.repeat(numpy.asarray(wildtype)[keep],
+                                        len(chars)),
+                'mutation':numpy.tile(chars, len(sites)),
+                'mutdiffsel':diffsel[keep][..., ichars].ravel(),
+                })
+            .sort_values('mutdiffsel', ascending=False, kind='mergesort')
+            .reset_index(drop=True)
+            )
+
+
+def mutToSiteDiffSel(mutdiffsel):
+    '''Data frame like the ``*_sitediffsel.csv`` files from *mutdiffsel*.
+
+    *mutdiffsel* is a data frame like those from :func:`mutDiffSelFrame`,
+    including its *sitekey* column.
+    Gives the sum of the absolute, positive, and negative differential
+    selection of each site, and its maximum and minimum.
+    '''
+    values = mutdiffsel['mutdiffsel']
+    return (mutdiffsel
+            .assign(abs_diffsel=values.abs(),
+                    positive_diffsel=values.clip(lower=0),
+                    negative_diffsel=values.clip(upper=0),
+                    max_diffsel=values,
+                    min_diffsel=values)
+            .groupby(['site', 'sitekey'], sort=False)
+            .agg({'abs_diffsel':'sum', 'positive_diffsel':'sum',
+                  'negative_diffsel':'sum', 'max_diffsel':'max',
+                  'min_diffsel':'min'})
+            .reset_index()
+            .sort_values('abs_diffsel', ascending=False, kind='mergesort')
+            .reset_index(drop=True)
+            )
+
+
+def diffselBatch(codoncounts, aacounts, batch, outdir,
+        summaryprefix='summary', pseudocount=PSEUDOCOUNT, includestop=True,
+        use_existing=False):
+    '''Writes the differential selection of every row of a fracsurvive batch.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts`` and
+    *aacounts* are its error-corrected amino-acid counts of shape
+    `(sample, site, character)`. *batch* is the ``fracsurvivebatch`` data
+    frame with the columns *group*, *name*, *sel*, and *mock*. For each row,
+    writes ``<group>-<name>_mutdiffsel.csv`` and
+    ``<group>-<name>_sitediffsel.csv`` to *outdir*. For each group, the
+    median and mean across replicates are written to
+    ``<summaryprefix>_<group>-<median|mean><mut|site>diffsel.csv``. If
+    *use_existing* is `True`, existing per-replicate files are read rather
+    than recomputed. Returns a data frame like *batch* with the added
+    columns *mutdiffsel* and *sitediffsel* giving the per-replicate files.
+    '''
+    wtindex = numpy.array([CHARACTERS.index(c) for c in
+            codoncounts.wildtypeAA()])
+    wildtype = codoncounts.wildtypeAA()
+    batch = batch.copy()
+    mutfiles = []
+    sitefiles = []
+    mutdfs = dict((group, []) for group in batch['group'].unique())
+    for row in batch.itertuples(index=False):
+        prefix = os.path.join(outdir, '{0}-{1}_'.format(row.group, row.name))
+        mutfile = prefix + 'mutdiffsel.csv'
+        sitefile = prefix + 'sitediffsel.csv'
+        if use_existing and os.path.isfile(mutfile) and os.path.isfile(
+                sitefile):
+            mutdf = pandas.read_csv(mutfile, dtype={'site':str})
+            if 'sitekey' not in mutdf.columns:
+                mutdf['sitekey'] = siteKeys(mutdf['site'])
+        else:
+            isel, imock = codoncounts.index([row.sel, row.mock])
+            mutdf = mutDiffSelFrame(codoncounts.sites, wildtype,
+                    mutDiffSel(aacounts[isel], aacounts[imock], wtindex,
+                               pseudocount),
+                    includestop, codoncounts.sitekeys)
+            mutdf.to_csv(mutfile, index=False)
+            mutToSiteDiffSel(mutdf).to_csv(sitefile, index=False)
+        mutfiles.append(mutfile)
+        sitefiles.append(sitefile)
+        mutdfs[row.group].append(mutdf)
+
+    for group, dfs in mutdfs.items():
+        merged = (pandas.concat(dfs)
+                  .groupby(['site', 'sitekey', 'wildtype', 'mutation'],
+                           sort=False)
+                  ['mutdiffsel'])
+        for stat in ['median', 'mean']:
+            mutdf = (merged.agg(stat)
+                     .reset_index()
+                     .sort_values('mutdiffsel', ascending=False,
+                                  kind='mergesort')
+                     .reset_index(drop=True)
+                     )
+            summary = os.path.join(outdir, '{0}_{1}-{2}'.format(
+                    summaryprefix, group, stat))
+            mutdf.to_csv(summary + 'mutdiffsel.csv', index=False)
+            mutToSiteDiffSel(mutdf).to_csv(summary + 'sitediffsel.csv',
+                    index=False)
+
+    return batch.assign(mutdiffsel=mutfiles, sitediffsel=sitefiles)
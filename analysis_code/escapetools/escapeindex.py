@@ -0,0 +1,108 @@
+'''Index of the strongest escape mutations for each antibody.
+
+A :class:`MutEscapeIndex` keeps each antibody's mutations sorted by
+*mutfracsurvive*, along with the positions of each site's mutations in that
+order. The top mutations overall are then a slice, the top mutations at a
+site are the first few positions for that site, and the top mutations in a
+region are a k-way merge of its sites' lists that stops after *k* items.
+'''
+
+
+import heapq
+import itertools
+
+import numpy
+import pandas
+
+from escapetools.sites import siteKeys
+
+MUT_COLS = ['site', 'wildtype', 'mutation', 'mutfracsurvive']
+
+
+class _AntibodyIndex(object):
+    '''Mutations of one antibody sorted by decreasing *mutfracsurvive*.'''
+
+    def __init__(self, df):
+        df = (df[MUT_COLS]
+              .assign(site=df['site'].astype(str))
+              .sort_values('mutfracsurvive', ascending=False, kind='mergesort')
+              .reset_index(drop=True)
+              )
+        self.df = df
+        self.values = df['mutfracsurvive'].values
+        # positions of each site's mutations, in decreasing order of value
+        self.sitepositions = dict((site, numpy.asarray(positions)) for
+                site, positions in df.groupby('site', sort=False).indices.items())
+        self.sites = numpy.array(list(self.sitepositions), dtype=object)
+        self.sitekeys = siteKeys(self.sites)
+
+    def top(self, k):
+        return self.df.iloc[ : k]
+
+    def topAtSites(self, sites, k):
+        lists = [self.sitepositions[s] for s in sites if s in self.sitepositions]
+        merged = heapq.merge(*lists, key=lambda i: -self.values[i])
+        return self.df.iloc[list(itertools.islice(merged, k))]
+
+
+class MutEscapeIndex(object):
+    '''Top-*k* queries over the mutation fraction surviving of antibodies.
+
+    *tables* is a dict keyed by antibody of data frames with the columns
+    *site*, *wildtype*, *mutation*, and *mutfracsurvive*, such as the
+    ``antibody_<Ab>_median.csv`` files.
+    '''
+
+    def __init__(self, tables=None):
+        self._indices = {}
+        for antibody, df in (tables or {}).items():
+            self._indices[antibody] = _AntibodyIndex(df)
+
+    @classmethod
+    def fromCatalog(cls, catalog):
+        '''Index of the antibody median files of a ``ResultsCatalog``.'''
+        return cls(dict((antibody, catalog.antibodyMedian(antibody)) for
+                antibody in catalog.antibodies()))
+
+    def antibodies(self):
+        '''List of indexed antibodies.'''
+        return list(self._indices)
+
+    def update(self, antibody, df):
+        '''Adds or replaces mutations of *antibody* from the data frame *df*.
+
+        Mutations in *df* replace any existing values for the same site and
+        mutation, and other existing mutations are kept. Only the index of
+        *antibody* is rebuilt.
+        '''
+        if antibody in self._indices:
+            old = self._indices[antibody].df
+            df = df[MUT_COLS].assign(site=df['site'].astype(str))
+            keys = pandas.MultiIndex.from_arrays([siteKeys(df['site']),
+                    df['mutation']])
+            keep = ~pandas.MultiIndex.from_arrays([siteKeys(old['site']),
+                    old['mutation']]).isin(keys)
+            df = pandas.concat([old[keep], df], ignore_index=True)
+        self._indices[antibody] = _AntibodyIndex(df)
+
+    def topk(self, antibody, k=10, site=None, sites=None):
+        '''The *k* mutations of *antibody* with the largest *mutfracsurvive*.
+
+        By default considers all mutations. Set *site* to consider only one
+        site, or *sites* to consider a region, given either as a list of
+        sites or a function of an array of site keys (see
+        ``escapetools.sites``) that returns `True` for keys in the region
+        (such as ``escapetools.sites.isHA2Key``). Returns a data frame
+        sorted by decreasing *mutfracsurvive*.
+        '''
+        index = self._indices[antibody]
+        if site is not None:
+            sites = [str(site)]
+        if sites is None:
+            df = index.top(k)
+        else:
+            if callable(sites):
+                sites = index.sites[numpy.asarray(sites(index.sitekeys),
+                        dtype=bool)]
+            df = index.topAtSites([str(s) for s in sites], k)
+        return df.reset_index(drop=True)
@@ -0,0 +1,207 @@
+'''Local HTTP service for looking up fraction surviving values.
+
+Loads the fracsurvive results once and answers queries with JSON, so tools
+that need a few values do not each re-parse the CSV files. Start it from the
+``analysis_code`` directory with::
+
+    python -m escapetools.escapeserver --port 8765
+
+and query it with URLs such as::
+
+    http://localhost:8765/median?antibody=FI6v3&site=280
+    http://localhost:8765/median_avgsite?antibody=C179&site=(HA2)46
+    http://localhost:8765/replicate?antibody=FI6v3&concentration=100ng-ml&mutation=S
+
+Every table can be filtered by any of its columns. The tables are:
+
+  * *median*: the ``antibody_<Ab>_median.csv`` files, with the columns
+    *antibody*, *site*, *wildtype*, *mutation*, and *mutfracsurvive*.
+
+  * *median_avgsite*: the ``antibody_<Ab>_median_avgsite.csv`` files, with
+    the columns *antibody*, *site*, *avgfracsurvive*, and *maxfracsurvive*.
+
+  * *replicate*: the per-replicate ``<group>-<replicate>_mutfracsurvive.csv``
+    files output by ``dms2_batch_fracsurvive``, with the columns *antibody*,
+    *concentration*, *replicate*, *site*, *wildtype*, *mutation*, and
+    *mutfracsurvive*.
+
+Filters on numeric columns such as *mutfracsurvive* match the value as a
+number. A query for a table that does not exist gets a 404 response, one
+with a column the table does not have or a non-numeric value for a numeric
+column gets a 400 response, and both give the reason as JSON. Any other
+error, including an unexpected `KeyError`, gets a 500 response. Recent query
+results are kept in a least-recently-used cache.
+'''
+
+
+import os
+import glob
+import json
+import argparse
+import functools
+import socketserver
+import http.server
+import urllib.parse
+
+import pandas
+
+from escapetools.filenames import parseFracSurviveFile, parseMedianFile
+
+
+class UnknownTable(KeyError):
+    '''Raised by `EscapeStore` for a query of a table it does not have.'''
+
+
+def loadMedians(mediandir):
+    '''Reads the ``antibody_<Ab>_median*.csv`` files in *mediandir*.
+
+    Returns a dict with the data frames for the *median* and
+    *median_avgsite* tables.
+    '''
+    tables = {'median':[], 'median_avgsite':[]}
+    for f in sorted(glob.glob(os.path.join(mediandir, 'antibody_*_median*.csv'))):
+        info = parseMedianFile(f)
+        if info is None:
+            continue
+        table = 'median_avgsite' if info['kind'] == 'site' else 'median'
+        tables[table].append(pandas.read_csv(f, dtype={'site':str})
+                .assign(antibody=info['antibody']))
+    return dict((table, pandas.concat(dfs, ignore_index=True))
+                for table, dfs in tables.items() if dfs)
+
+
+def loadReplicates(fracsurvivedir):
+    '''Reads the per-replicate ``*_mutfracsurvive.csv`` files in *fracsurvivedir*.'''
+    dfs = []
+    for f in sorted(glob.glob(os.path.join(fracsurvivedir,
+            '*_mutfracsurvive.csv'))):
+        info = parseFracSurviveFile(f)
+        if info is None or info['kind'] != 'mut':
+            continue
+        dfs.append(pandas.read_csv(f, dtype={'site':str})
+                .assign(antibody=info['antibody'],
+                        concentration=info['concentration'],
+                        replicate=info['replicate']))
+    if not dfs:
+        raise ValueError("no mutfracsurvive files in {0}".format(fracsurvivedir))
+    return pandas.concat(dfs, ignore_index=True)
+
+
+class EscapeStore(object):
+    '''Fraction surviving tables held in memory for repeated queries.
+
+    *tables* is a dict of data frames keyed by table name. Queries are
+    cached in a least-recently-used cache of size *cachesize*.
+    '''
+
+    def __init__(self, tables, cachesize=1024):
+        self.tables = {}
+        for name, df in tables.items():
+            df = df.copy()
+            for col in df.columns:
+                if not pandas.api.types.is_numeric_dtype(df[col]):
+                    df[col] = df[col].astype('category')
+            self.tables[name] = df
+        self.query = functools.lru_cache(maxsize=cachesize)(self._query)
+
+    @classmethod
+    def fromDirs(cls, mediandir=None, fracsurvivedir=None, **kwargs):
+        '''Builds a store from the median and / or per-replicate directories.'''
+        tables = {}
+        if mediandir:
+            tables.update(loadMedians(mediandir))
+        if fracsurvivedir:
+            tables['replicate'] = loadReplicates(fracsurvivedir)
+        return cls(tables, **kwargs)
+
+    def _query(self, table, filters):
+        '''Rows of *table* matching *filters*, as a JSON string.
+
+        *filters* is a tuple of `(column, value)` pairs of strings. Call
+        through *query*, which caches the results. Raises an
+        :class:`UnknownTable` if there is no *table*, and a `ValueError` if a
+        column is not in it or a value for a numeric column is not a number.
+        '''
+        if table not in self.tables:
+            raise UnknownTable("no table {0}, tables are: {1}".format(
+                    table, ', '.join(sorted(self.tables))))
+        df = self.tables[table]
+        mask = pandas.Series(True, index=df.index)
+        for col, value in filters:
+            if col not in df.columns:
+                raise ValueError("table {0} has no column {1}".format(table,
+                        col))
+            if pandas.api.types.is_numeric_dtype(df[col]):
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError("column {0} is numeric, but {1} is not a "
+                            "number".format(col, value))
+            mask &= (df[col] == value)
+        return df[mask].to_json(orient='records')
+
+
+class _QueryHandler(http.server.BaseHTTPRequestHandler):
+    '''Answers ``GET /<table>?<column>=<value>&...`` requests.'''
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        table = url.path.strip('/')
+        filters = tuple(sorted(urllib.parse.parse_qsl(url.query)))
+        try:
+            body, status = self.server.store.query(table, filters), 200
+        except UnknownTable as e:
+            body, status = json.dumps({'error':str(e.args[0])}), 404
+        except ValueError as e:
+            body, status = json.dumps({'error':str(e)}), 400
+        except Exception as e:
+            body, status = json.dumps({'error':'internal error: {0}'.format(
+                    e)}), 500
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class EscapeServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    '''HTTP server answering queries against the `EscapeStore` *store*.'''
+
+    daemon_threads = True
+
+    def __init__(self, store, host='localhost', port=8765):
+        self.store = store
+        http.server.HTTPServer.__init__(self, (host, port), _QueryHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mediandir',
+            default='../paper/figs/medianfracsurvivefiles_excess/',
+            help='directory with antibody_<Ab>_median*.csv files')
+    parser.add_argument('--fracsurvivedir',
+            default='./results/fracsurviveaboveavg/',
+            help='directory with per-replicate *_mutfracsurvive.csv files')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cachesize', type=int, default=1024,
+            help='number of query results to cache')
+    args = parser.parse_args()
+
+    store = EscapeStore.fromDirs(args.mediandir, args.fracsurvivedir,
+            cachesize=args.cachesize)
+    server = EscapeServer(store, args.host, args.port)
+    print("Serving tables {0} at http://{1}:{2}/".format(
+            ', '.join(sorted(store.tables)), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+'''Exports figures and data files to the paper directory.
+
+An export manifest is a list of `(source, destination)` pairs, where the
+destination is either a file name or a directory ending in ``/``. Files
+whose content is unchanged are skipped, changed files are copied (or, if
+asked for, hard linked when the source and destination are on the same
+file system), and the exports run concurrently. :func:`updateZip` builds a zip
+archive of a directory, only rewriting it when the contents change.
+'''
+
+
+import os
+import glob
+import shutil
+import hashlib
+import zipfile
+import zlib
+import tempfile
+import concurrent.futures
+
+
+def _fileHash(path, blocksize=1 << 20):
+    '''SHA-256 hex digest of the contents of *path*.'''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _destination(source, dest):
+    if dest.endswith('/') or os.path.isdir(dest):
+        return os.path.join(dest, os.path.basename(source))
+    return dest
+
+
+def _sameContents(source, dest):
+    '''Whether the files *source* and *dest* have the same contents.'''
+    return (os.path.getsize(source) == os.path.getsize(dest) and
+            _fileHash(source) == _fileHash(dest))
+
+
+def exportFile(source, dest, link=False):
+    '''Exports *source* to *dest* if the contents differ.
+
+    By default *dest* is a copy. If *link* is `True` a hard link is made
+    when possible instead, but a linked *dest* then changes along with
+    *source* if *source* is later rewritten in place. Without *link*, a
+    *dest* that is a hard link to *source* is replaced by a copy. Returns
+    ``unchanged``, ``linked``, or ``copied``.
+    '''
+    dest = _destination(source, dest)
+    if os.path.isfile(dest):
+        if os.path.samefile(source, dest):
+            if link:
+                return 'unchanged'
+        elif _sameContents(source, dest):
+            return 'unchanged'
+    destdir = os.path.dirname(dest) or '.'
+    if not os.path.isdir(destdir):
+        os.makedirs(destdir)
+    # write to a temporary name and rename so *dest* is never partial
+    fd, tmp = tempfile.mkstemp(dir=destdir, prefix='.export_')
+    os.close(fd)
+    os.remove(tmp)
+    status = 'copied'
+    if link:
+        try:
+            os.link(source, tmp)
+            status = 'linked'
+        except OSError:
+            pass
+    if status == 'copied':
+        shutil.copy2(source, tmp)
+    os.replace(tmp, dest)
+    return status
+
+
+def expandManifest(manifest):
+    '''Expands glob patterns in the sources of *manifest*.'''
+    expanded = []
+    for source, dest in manifest:
+        matches = sorted(glob.glob(source))
+        if not matches:
+            raise IOError("no files match {0}".format(source))
+        expanded += [(m, dest) for m in matches]
+    return expanded
+
+
+def exportFiles(manifest, ncpus=4, link=False):
+    '''Exports all `(source, destination)` pairs in *manifest*.
+
+    Sources may be glob patterns. The files are exported by :func:`exportFile`
+    with *link* using *ncpus* threads. Returns a dict mapping each destination file to
+    its status.
+    '''
+    manifest = expandManifest(manifest)
+    with concurrent.futures.ThreadPoolExecutor(ncpus) as executor:
+        statuses = executor.map(lambda x: exportFile(x[0], x[1], link),
+                                manifest)
+        return dict((_destination(source, dest), status) for
+                (source, dest), status in zip(manifest, statuses))
+
+
+def updateZip(zipname, directory):
+    '''Makes *zipname* a zip of the files in *directory*.
+
+    The archive has the files under the base name of *directory*, as in
+    the existing ``medianfracsurvivefiles.zip``. It is left alone if its
+    contents already match, appended to if files were only added, and
+    rewritten otherwise. Returns ``unchanged``, ``appended``, or
+    ``rewritten``.
+    '''
+    arcdir = os.path.basename(os.path.normpath(directory))
+    wanted = {}
+    for f in sorted(os.listdir(directory)):
+        path = os.path.join(directory, f)
+        if os.path.isfile(path) and not f.startswith('.'):
+            with open(path, 'rb') as fh:
+                wanted['{0}/{1}'.format(arcdir, f)] = (path,
+                        zlib.crc32(fh.read()) & 0xffffffff)
+
+    existing = {}
+    if os.path.isfile(zipname):
+        with zipfile.ZipFile(zipname) as z:
+            existing = dict((i.filename, i.CRC) for i in z.infolist()
+                            if not i.filename.endswith('/'))
+
+    if existing == dict((name, crc) for name, (_, crc) in wanted.items()):
+        return 'unchanged'
+    if existing and all(wanted.get(name, (None, None))[1] == crc
+                        for name, crc in existing.items()):
+        with zipfile.ZipFile(zipname, 'a', zipfile.ZIP_DEFLATED) as z:
+            for name, (path, _) in wanted.items():
+                if name not in existing:
+                    z.write(path, name)
+        return 'appended'
+
+    tmp = zipname + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.write(directory, arcdir + '/')
+        for name, (path, _) in wanted.items():
+            z.write(path, name)
+    os.replace(tmp, zipname)
+    return 'rewritten'
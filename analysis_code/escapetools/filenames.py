@@ -0,0 +1,81 @@
+'''Parses the names of the files output by the analysis.'''
+
+
+import os
+import re
+
+#: matches the per-replicate output files of ``dms2_batch_fracsurvive``,
+#: such as ``FI6v3-100ng-ml-replicate-1a_mutfracsurvive.csv``
+FRACSURVIVE_FILE_RE = re.compile(
+        r'^(?P<group>(?P<antibody>[^-]+)-(?P<concentration>.+))-'
+        r'(?P<replicate>replicate-[^_]+)_(?P<kind>mut|site)fracsurvive\.csv$')
+
+#: matches the output files of ``dms2_batch_bcsubamp``, such as
+#: ``L1-mock-r1-A_codoncounts.csv``
+CODONCOUNTS_FILE_RE = re.compile(r'^(?P<sample>.+)_codoncounts\.csv$')
+
+#: matches the across-concentration median files written by
+#: ``escapetools.medians``, such as ``antibody_FI6v3_median.csv`` and
+#: ``antibody_FI6v3_median_avgsite.csv``
+MEDIAN_FILE_RE = re.compile(r'^antibody_(?P<antibody>.+)_median'
+                            r'(?P<avgsite>_avgsite)?\.csv$')
+
+
+def parseFracSurviveFile(f):
+    '''Parses the name of a per-replicate fracsurvive file.
+
+    Returns a dict with the keys *group*, *antibody*, *concentration*,
+    *replicate*, and *kind* (``mut`` or ``site``), or `None` if *f* is not
+    such a file.
+
+    >>> d = parseFracSurviveFile('x/FI6v3-100ng-ml-replicate-1a_mutfracsurvive.csv')
+    >>> [d[key] for key in ['group', 'antibody', 'concentration', 'replicate', 'kind']]
+    ['FI6v3-100ng-ml', 'FI6v3', '100ng-ml', 'replicate-1a', 'mut']
+    '''
+    m = FRACSURVIVE_FILE_RE.match(os.path.basename(f))
+    return m.groupdict() if m else None
+
+
+def parseCodonCountsFile(f):
+    '''Sample name for the codon counts file *f*, or `None`.
+
+    >>> parseCodonCountsFile('results/codoncounts/L1-mock-r1-A_codoncounts.csv')
+    'L1-mock-r1-A'
+    '''
+    m = CODONCOUNTS_FILE_RE.match(os.path.basename(f))
+    return m.group('sample') if m else None
+
+
+def parseMedianFile(f):
+    '''Parses the name of an across-concentration median file.
+
+    Returns a dict with the keys *antibody* and *kind* (``mut`` for the
+    ``antibody_<Ab>_median.csv`` files and ``site`` for the
+    ``antibody_<Ab>_median_avgsite.csv`` files), or `None` if *f* is not
+    such a file.
+
+    >>> d = parseMedianFile('x/antibody_C179_median_avgsite.csv')
+    >>> d['antibody'], d['kind']
+    ('C179', 'site')
+    '''
+    m = MEDIAN_FILE_RE.match(os.path.basename(f))
+    if not m:
+        return None
+    return {'antibody':m.group('antibody'),
+            'kind':'site' if m.group('avgsite') else 'mut'}
+
+
+def medianFileAntibodies(medianfiles, kind='mut'):
+    '''List of the antibodies of the median files *medianfiles*.
+
+    Raises a `ValueError` if any file is not a median file of *kind* (see
+    :func:`parseMedianFile`).
+    '''
+    antibodies = []
+    for f in medianfiles:
+        info = parseMedianFile(f)
+        if info is None or info['kind'] != kind:
+            raise ValueError("{0} is not an antibody_<Ab>_median{1}.csv "
+                    "file".format(f, {'mut':'', 'site':'_avgsite'}[kind]))
+        antibodies.append(info['antibody'])
+    return antibodies
@@ -0,0 +1,93 @@
+'''Library fraction surviving from the qPCR escape fractions.
+
+``../lab_notes/allsamples_escapefractions.csv`` gives the qPCR-measured
+``fractional_infectivity`` of each selection, with sample names like
+``L1_FI6v3_c1_r1`` (library, antibody, concentration code, and optional
+replicate). These are the *libfracsurvive* values needed by
+``dms2_batch_fracsurvive``. The functions here translate those names to
+the sample names in ``data/samples.csv`` and join the values onto the
+samples in one pass, rather than copying them over by hand.
+'''
+
+
+import pandas
+
+#: maps (antibody, concentration code) in the qPCR sample names to the
+#: concentration used in the sample names of ``data/samples.csv``
+CONCENTRATION_CODES = {
+        ('FI6v3', 'c1'):'100ng-ml',
+        ('FI6v3', 'c2'):'200ng-ml',
+        ('H17L19', 'c2'):'1ug-ml',
+        ('H17L19', 'c3'):'10ug-ml',
+        ('H17L10', 'c2'):'3ug-ml',
+        ('H17L7', 'c3'):'15ug-ml',
+        }
+
+_SAMPLE_NAME_RE = (r'^(?P<library>L\d+)_(?P<antibody>[^_]+)_'
+                   r'(?P<code>c\d+)(?:_(?P<replicate>r\d+))?$')
+
+
+def readEscapeFractions(csvfile, codes=CONCENTRATION_CODES):
+    '''Reads the qPCR escape fractions in *csvfile*.
+
+    Returns a data frame with the columns *library*, *antibody*, *code*,
+    *replicate*, *fractional_infectivity*, and *name*, where *name* is the
+    sample name in ``data/samples.csv``. *name* is `NaN` for selections
+    whose concentration code is not in *codes* (such as concentrations that
+    were not sequenced).
+    '''
+    df = pandas.read_csv(csvfile)
+    parsed = df['sample_name'].str.extract(_SAMPLE_NAME_RE)
+    bad = df['sample_name'][parsed['library'].isnull()]
+    if len(bad):
+        raise ValueError("cannot parse sample names:\n{0}".format(
+                '\n'.join(bad)))
+    df = pandas.concat([df, parsed], axis=1)
+    codes = pandas.Series(codes, name='concentration')
+    codes.index.names = ['antibody', 'code']
+    df = df.merge(codes.reset_index(), on=['antibody', 'code'], how='left')
+    df['name'] = (df['library'] + '-' + df['antibody'] + '-' +
+                  df['concentration'] +
+                  ('-' + df['replicate']).fillna(''))
+    return df.drop('concentration', axis=1)
+
+
+def addLibFracSurvive(samples, csvfile, codes=CONCENTRATION_CODES):
+    '''Sets *libfracsurvive* in *samples* from the qPCR values in *csvfile*.
+
+    *samples* is a data frame like ``data/samples.csv``. Samples with a
+    qPCR measurement get that value; the rest (for instance mock samples)
+    keep their existing *libfracsurvive*, or get `NaN` if there is none.
+    Also adds a *libfracsurvive_source* column that is ``qPCR`` or
+    ``samples``. Returns a new data frame.
+    '''
+    qpcr = (readEscapeFractions(csvfile, codes)
+            .dropna(subset=['name'])
+            .set_index('name')['fractional_infectivity']
+            )
+    samples = samples.copy()
+    measured = samples['name'].map(qpcr)
+    if 'libfracsurvive' in samples.columns:
+        existing = samples['libfracsurvive']
+    else:
+        existing = pandas.Series(float('nan'), index=samples.index)
+    samples['libfracsurvive'] = measured.fillna(existing)
+    samples['libfracsurvive_source'] = (measured.notnull()
+            .map({True:'qPCR', False:'samples'}))
+    return samples
+
+
+def summarizeLibFracSurvive(samples):
+    '''Summary of *libfracsurvive* for each antibody and concentration.
+
+    *samples* has the columns *antibody*, *ug/ml_Ab*, and *libfracsurvive*.
+    Returns a data frame with the number of selections and the mean,
+    median, standard deviation, and minimum / maximum *libfracsurvive*.
+    Mock samples (antibody ``none``) are excluded.
+    '''
+    return (samples
+            .query('antibody != "none"')
+            .groupby(['antibody', 'ug/ml_Ab'])['libfracsurvive']
+            .agg(['count', 'mean', 'median', 'std', 'min', 'max'])
+            .reset_index()
+            )
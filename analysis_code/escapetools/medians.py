@@ -0,0 +1,93 @@
+'''Across-concentration medians of the fraction surviving for each antibody.
+
+For each antibody, the across-replicate median mutation fraction surviving
+of each concentration are combined into an across-concentration median,
+converted to site values, written to ``antibody_<Ab>_median.csv`` and
+``antibody_<Ab>_median_avgsite.csv``, and drawn as a logo plot with
+``dms2_logoplot``. :func:`aggregateMedians` does this for many antibodies
+and output directories at once using a pool of worker processes.
+
+Requires `dms_tools2 <https://jbloomlab.github.io/dms_tools2/>`_.
+'''
+
+
+import os
+import subprocess
+import concurrent.futures
+
+import dms_tools2.fracsurvive
+
+
+def antibodyMedian(antibody, summaryfiles, outdir, use_existing=False):
+    '''Writes the across-concentration median files and logo plot for *antibody*.
+
+    *summaryfiles* are the across-replicate median mutation fraction
+    surviving files for each concentration of *antibody*, and the outputs
+    are written to *outdir*. If *use_existing* is `True`, ``dms2_logoplot``
+    keeps an existing logo plot.
+    Returns a dict with the *medianfile*, *avgsitefile*, and *logoplot*.
+    '''
+    medianmutdf = dms_tools2.fracsurvive.avgMutFracSurvive(summaryfiles,
+            'median')
+    avgsitedf = dms_tools2.fracsurvive.mutToSiteFracSurvive(medianmutdf)
+
+    medianfile = os.path.join(outdir, 'antibody_{0}_median.csv'.format(
+            antibody))
+    medianmutdf.to_csv(medianfile, index=False)
+    avgsitefile = os.path.join(outdir, 'antibody_{0}_median_avgsite.csv'
+            .format(antibody))
+    avgsitedf.to_csv(avgsitefile, index=False)
+
+    # scale bar unit is maximum effect
+    scaleunit = '{0:.1g}'.format(medianmutdf['mutfracsurvive'].max())
+    subprocess.check_output(['dms2_logoplot',
+            '--fracsurvive', medianfile,
+            '--name', antibody,
+            '--outdir', outdir,
+            '--numberevery', '5',
+            '--nperline', '81',
+            '--underlay', 'yes',
+            '--overlay1', medianfile, 'wildtype', 'wildtype',
+            '--scalebar', scaleunit, 'fraction surviving = {0}'.format(scaleunit),
+            '--use_existing', 'yes' if use_existing else 'no',
+            ], stderr=subprocess.STDOUT)
+    logoplot = os.path.join(outdir, '{0}_fracsurvive.pdf'.format(antibody))
+
+    return {'medianfile':medianfile, 'avgsitefile':avgsitefile,
+            'logoplot':logoplot}
+
+
+def _antibodyMedianJob(job):
+    return antibodyMedian(*job)
+
+
+def aggregateMedians(catalogs, ncpus=1, use_existing=False):
+    '''Runs :func:`antibodyMedian` for every antibody of several catalogs.
+
+    *catalogs* is a list of ``escapetools.catalog.ResultsCatalog`` objects,
+    for instance one for the fraction surviving above average and one for
+    the plain fraction surviving. The outputs for each catalog are written to
+    its output directory. All antibodies of all catalogs are processed
+    concurrently using at most *ncpus* processes. *use_existing* is passed
+    to :func:`antibodyMedian`.
+
+    Returns a list with an entry for each catalog, which is a dict keyed by
+    antibody of the dicts returned by :func:`antibodyMedian`.
+    '''
+    jobs = []
+    for i, catalog in enumerate(catalogs):
+        for antibody in catalog.antibodies():
+            summaryfiles = [catalog.groupSummaryFile(g) for g in
+                    catalog.groups(antibody)]
+            jobs.append((i, antibody, (antibody, summaryfiles, catalog.outdir,
+                    use_existing)))
+    if ncpus == 1:
+        results = list(map(_antibodyMedianJob, [job for _, _, job in jobs]))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(ncpus) as executor:
+            results = list(executor.map(_antibodyMedianJob,
+                    [job for _, _, job in jobs]))
+    aggregated = [{} for _ in catalogs]
+    for (i, antibody, _), result in zip(jobs, results):
+        aggregated[i][antibody] = result
+    return aggregated
@@ -0,0 +1,200 @@
+'''Maximum-likelihood fraction surviving pooled over replicates.
+
+Rather than computing the fraction surviving of each replicate and taking
+medians, all replicates of a group (one antibody at one concentration) are
+fit jointly. At each site :math:`r` of sample
+:math:`j`, the amino-acid counts of the selected sample are taken to be
+multinomial with probabilities
+
+.. math::
+
+    p_{j,r,x} = \\frac{q_{j,r,x} e^{\\beta_{r,x}}}{\\sum_y q_{j,r,y} e^{\\beta_{r,y}}}
+
+where :math:`q_{j,r,x}` is the frequency of :math:`x` in the mock sample
+and the log enrichment :math:`\\beta_{r,x}` relative to wildtype
+(:math:`\\beta_{r,\\rm{wt}} = 0`) is shared by all samples. The selected
+and mock counts get the same depth-scaled pseudocounts as in
+``escapetools.countarrays.fracSurvive``, which keeps the estimates finite
+for mutations that are never seen in a selected sample, and makes the
+estimate from a single replicate identical to the usual one. The likelihood
+is maximized by Newton's method at all sites at once, since the gradient and
+the `(character, character)` Hessian of every site are simple array
+expressions.
+
+The fraction surviving is then
+
+.. math::
+
+    F_{r,x} = \\gamma \\frac{e^{\\beta_{r,x}}}{\\sum_y \\bar{q}_{r,y} e^{\\beta_{r,y}}}
+
+where :math:`\\gamma` is the median library fraction surviving and
+:math:`\\bar{q}` the mean of the mock frequencies over samples, so that the
+mock-weighted average of :math:`F` at a site is :math:`\\gamma` as for the
+per-replicate estimates.
+
+Replicates differ by much more than multinomial sampling, so the inverse
+Hessian alone gives standard errors several times smaller than the spread
+of the replicates. The covariance of :math:`\\beta` is therefore the
+sandwich estimator :math:`H^{-1} \\left(\\sum_j u_j u_j^T\\right) H^{-1}`,
+where :math:`u_j` is the score of sample :math:`j`, which reflects the
+variation between replicates. The standard error of :math:`F` is from this
+covariance by the delta method, and is never taken to be smaller than that
+from the inverse Hessian. It cannot be estimated from one sample.
+'''
+
+
+import os
+
+import numpy
+
+from escapetools.countarrays import (mutFracSurviveFrame, CHARACTERS,
+        PSEUDOCOUNT)
+
+
+def pseudocounted(sel, mock, pseudocount=PSEUDOCOUNT):
+    '''Selected counts and mock frequencies with depth-scaled pseudocounts.
+
+    *sel* and *mock* are amino-acid counts of shape
+    `(..., site, character)`. As in ``escapetools.countarrays.fracSurvive``,
+    the pseudocount of the deeper sample at each site is scaled by the ratio
+    of depths. Returns `(sel, q)`, the selected counts plus their
+    pseudocount and the frequencies of the mock counts plus theirs.
+    '''
+    sel = numpy.asarray(sel, dtype='float')
+    mock = numpy.asarray(mock, dtype='float')
+    selDepth = sel.sum(axis=-1, keepdims=True)
+    mockDepth = mock.sum(axis=-1, keepdims=True)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        selPseudo = pseudocount * numpy.maximum(1, selDepth / mockDepth)
+        mockPseudo = pseudocount * numpy.maximum(1, mockDepth / selDepth)
+    mock = mock + mockPseudo
+    return sel + selPseudo, mock / mock.sum(axis=-1, keepdims=True)
+
+
+def fitEnrichment(sel, q, wtindex, maxiter=100, tol=1e-8):
+    '''Maximum-likelihood log enrichment of every character at every site.
+
+    *sel* are selected counts of shape `(sample, site, character)` and *q*
+    the frequencies in the matching mock samples, both as returned by
+    :func:`pseudocounted`, and *wtindex* gives the wildtype character of
+    each site.
+
+    Returns `(beta, cov, niter)`: the log enrichments of shape
+    `(site, character)`, their model-based covariance (the inverse of the
+    Hessian) of shape `(site, character, character)` (zero for wildtype),
+    and the number of Newton iterations. Raises a `RuntimeError` if the fit
+    does not converge in *maxiter* iterations.
+    '''
+    logq = numpy.log(q)
+    nsample, nsite, nchar = sel.shape
+    isite = numpy.arange(nsite)
+    free = numpy.ones((nsite, nchar))
+    free[isite, wtindex] = 0
+    seltotal = sel.sum(axis=0)
+    depth = sel.sum(axis=-1, keepdims=True)
+    eye = numpy.eye(nchar)
+    # wildtype rows and columns of the Hessian are replaced by the identity
+    wtblock = (1 - free)[ : , : , None] * eye
+
+    # start from the log ratio of the pooled selected and mock frequencies
+    beta = numpy.log((seltotal / depth.sum(axis=0)) / q.mean(axis=0))
+    beta = (beta - beta[isite, wtindex][ : , None]) * free
+    for niter in range(1, maxiter + 1):
+        logits = logq + beta
+        p = numpy.exp(logits - logits.max(axis=-1, keepdims=True))
+        p /= p.sum(axis=-1, keepdims=True)
+        expected = depth * p
+        grad = (seltotal - expected.sum(axis=0)) * free
+        # negative Hessian: sum over samples of N (diag(p) - p p^T)
+        info = (numpy.einsum('jrx,xy->rxy', expected, eye) -
+                numpy.einsum('jrx,jry->rxy', expected, p))
+        info = info * free[ : , : , None] * free[ : , None, : ] + wtblock
+        step = numpy.linalg.solve(info, grad[..., None])[..., 0]
+        # limit the step so the fit is stable far from the maximum
+        step = numpy.clip(step, -5, 5)
+        beta += step
+        if numpy.abs(step).max() < tol:
+            break
+    else:
+        raise RuntimeError("fit did not converge in {0} iterations".format(
+                maxiter))
+    cov = numpy.linalg.inv(info) * free[ : , : , None] * free[ : , None, : ]
+    return beta, cov, niter
+
+
+def sandwichCovariance(sel, q, beta, cov):
+    '''Covariance of the log enrichments robust to overdispersion.
+
+    *sel* and *q* are as for :func:`fitEnrichment`, and *beta* and *cov*
+    are returned by it. The scores of the samples are scaled by
+    :math:`n / (n - 1)` for *n* samples. Returns an array of shape
+    `(site, character, character)`, which is `NaN` for one sample.
+    '''
+    nsample = sel.shape[0]
+    if nsample < 2:
+        return numpy.full(cov.shape, numpy.nan)
+    logits = numpy.log(q) + beta
+    p = numpy.exp(logits - logits.max(axis=-1, keepdims=True))
+    p /= p.sum(axis=-1, keepdims=True)
+    # score of each sample, shape (sample, site, character)
+    scores = sel - sel.sum(axis=-1, keepdims=True) * p
+    meat = (numpy.einsum('jrx,jry->rxy', scores, scores) *
+            nsample / float(nsample - 1))
+    return numpy.einsum('rxy,ryz,rzw->rxw', cov, meat, cov)
+
+
+def pooledFracSurvive(sel, mock, libfracsurvive, wtindex,
+        pseudocount=PSEUDOCOUNT):
+    '''Pooled fraction surviving and its standard error.
+
+    *sel* and *mock* are amino-acid counts of shape
+    `(sample, site, character)`, with row *j* of *mock* the mock of row *j*
+    of *sel*, and *libfracsurvive* gives the library fraction surviving of
+    each sample. Returns the arrays `(fracsurvive, se)` of shape
+    `(site, character)`; *se* is `NaN` for a single sample.
+    '''
+    sel, q = pseudocounted(sel, mock, pseudocount)
+    beta, cov, _ = fitEnrichment(sel, q, wtindex)
+    robustcov = sandwichCovariance(sel, q, beta, cov)
+    weights = q.mean(axis=0) * numpy.exp(beta)
+    norm = weights.sum(axis=-1, keepdims=True)
+    fracsurvive = numpy.median(libfracsurvive) * numpy.exp(beta) / norm
+    # gradient of log F_x with respect to beta is e_x - weights / norm
+    grad = numpy.eye(beta.shape[-1])[None] - (weights / norm)[ : , None, : ]
+    var = numpy.maximum(numpy.einsum('rxy,ryz,rxz->rx', grad, robustcov, grad),
+            numpy.einsum('rxy,ryz,rxz->rx', grad, cov, grad))
+    return fracsurvive, fracsurvive * numpy.sqrt(var)
+
+
+def mlFracSurviveBatch(codoncounts, aacounts, batch, outdir, by='group',
+        pseudocount=PSEUDOCOUNT, use_existing=False):
+    '''Writes the pooled fraction surviving of each group of a fracsurvive batch.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts`` and
+    *aacounts* are its error-corrected amino-acid counts. *batch* is the
+    ``fracsurvivebatch`` data frame, and all of its rows with the same value
+    of the column *by* are fit together. This should be ``group``, since
+    one enrichment is shared by all samples in a fit, and the enrichment
+    differs between concentrations.
+    For each value, the file ``<by>_<value>_mlmutfracsurvive.csv`` is written
+    to *outdir* with the columns of the ``*_mutfracsurvive.csv`` files plus
+    *mutfracsurvive_se*. If *use_existing* is `True`, existing files are
+    kept. Returns a dict mapping each value to its file.
+    '''
+    wtindex = numpy.array([CHARACTERS.index(c) for c in
+            codoncounts.wildtypeAA()])
+    files = {}
+    for key, df in batch.groupby(by, sort=False):
+        f = os.path.join(outdir, '{0}_{1}_mlmutfracsurvive.csv'.format(by,
+                key))
+        files[key] = f
+        if use_existing and os.path.isfile(f):
+            continue
+        fracsurvive, se = pooledFracSurvive(
+                aacounts[codoncounts.index(df['sel'])],
+                aacounts[codoncounts.index(df['mock'])],
+                df['libfracsurvive'].values, wtindex, pseudocount)
+        mutFracSurviveFrame(codoncounts.sites, codoncounts.wildtypeAA(),
+                fracsurvive, {'mutfracsurvive_se':se},
+                codoncounts.sitekeys).to_csv(f, index=False)
+    return files
@@ -0,0 +1,143 @@
+'''Technical noise of the fraction surviving from paired mock samples.
+
+Each library has two mock samples, ``-A`` and ``-B``, that are technical
+replicates of the same unselected library. Any difference between them is
+technical noise. For each pair, the fraction surviving of the ``-A`` mock
+relative to the ``-B`` mock is computed with a library fraction surviving of
+one, in the same way as for a selected sample (see
+``escapetools.countarrays.fracSurvive``), so that its :math:`\\log_2` is zero
+in the absence of noise. All pairs are computed at once from the stacked
+amino-acid counts.
+
+The noise of a mutation is the root mean square of this :math:`\\log_2`
+ratio over all pairs. A mutation with few counts in both mocks can have
+nearly equal ratios by chance (exactly zero if it has no counts, since the
+pseudocounts are then equal), so the noise is never taken to be less than
+the Poisson sampling noise of the counts,
+:math:`\\sqrt{1 / (n^A + P^A) + 1 / (n^B + P^B)} / \\ln 2`, averaged over
+pairs in the same way. Mutations without counts in any mock cannot be
+tested. A selected sample's fraction surviving can then only be
+distinguished from noise if it exceeds the library fraction surviving by
+more than the fold change ``foldfloor`` that the noise allows.
+'''
+
+
+import re
+
+import numpy
+import pandas
+
+from escapetools.countarrays import (fracSurvive, codingSites, CHARACTERS,
+        AAS, PSEUDOCOUNT)
+from escapetools.sites import siteKeys
+
+#: matches the name of an ``-A`` or ``-B`` mock sample
+MOCK_RE = re.compile(r'^(?P<pair>.+-mock.*)-(?P<replicate>[AB])$')
+
+
+def mockPairs(samples):
+    '''List of `(pair, A sample, B sample)` for the mock pairs in *samples*.
+
+    >>> mockPairs(['L1-mock-r1-A', 'L1-mock-r1-B', 'L2-mock-A', 'L3-mock-A'])
+    [('L1-mock-r1', 'L1-mock-r1-A', 'L1-mock-r1-B')]
+    '''
+    found = {}
+    for sample in samples:
+        m = MOCK_RE.match(sample)
+        if m:
+            found.setdefault(m.group('pair'), {})[m.group('replicate')] = sample
+    return [(pair, found[pair]['A'], found[pair]['B']) for pair in
+            sorted(found) if len(found[pair]) == 2]
+
+
+def mockNoise(codoncounts, aacounts, pairs=None, pseudocount=PSEUDOCOUNT):
+    '''Data frame of the :math:`\\log_2` ratio between each pair of mocks.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts`` and
+    *aacounts* are its (error-corrected) amino-acid counts. *pairs* is a
+    list like that from :func:`mockPairs`, by default all pairs in
+    *codoncounts*. The data frame has the columns *site*, *sitekey* (see
+    ``escapetools.sites``), *wildtype*, *mutation*, *pair*, *log2ratio*, *poissonvar* (the Poisson variance of
+    *log2ratio*), and *counts* (the summed counts of both mocks), for all
+    non-stop mutations at sites without a wildtype stop codon.
+    '''
+    if pairs is None:
+        pairs = mockPairs(codoncounts.samples)
+    if not pairs:
+        raise ValueError("no pairs of mock samples")
+    ia = codoncounts.index([a for _, a, _ in pairs])
+    ib = codoncounts.index([b for _, _, b in pairs])
+    keep = codingSites(codoncounts.wildtypeAA())
+    a = aacounts[ia][ : , keep]
+    b = aacounts[ib][ : , keep]
+    log2ratio = numpy.log2(fracSurvive(a, b, numpy.ones(len(pairs)),
+            pseudocount))
+    # pseudocounts scaled by the ratio of depths, as in fracSurvive
+    adepth = a.sum(axis=-1, keepdims=True)
+    bdepth = b.sum(axis=-1, keepdims=True)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        apseudo = pseudocount * numpy.maximum(1, adepth / bdepth)
+        bpseudo = pseudocount * numpy.maximum(1, bdepth / adepth)
+    poissonvar = (1 / (a + apseudo) + 1 / (b + bpseudo)) / numpy.log(2)**2
+    iaas = [CHARACTERS.index(aa) for aa in AAS]
+    sites = codoncounts.sites[keep]
+    return pandas.DataFrame({
+            'site':numpy.tile(numpy.repeat(sites, len(AAS)), len(pairs)),
+            'sitekey':numpy.tile(numpy.repeat(codoncounts.sitekeys[keep],
+                                              len(AAS)), len(pairs)),
+            'wildtype':numpy.tile(numpy.repeat(
+                    codoncounts.wildtypeAA()[keep], len(AAS)), len(pairs)),
+            'mutation':numpy.tile(AAS, len(sites) * len(pairs)),
+            'pair':numpy.repeat([pair for pair, _, _ in pairs],
+                                len(sites) * len(AAS)),
+            'log2ratio':log2ratio[..., iaas].ravel(),
+            'poissonvar':poissonvar[..., iaas].ravel(),
+            'counts':(a + b)[..., iaas].ravel(),
+            })
+
+
+def noiseFloor(noise, nsigma=2):
+    '''Noise floor of each mutation from the data frame of :func:`mockNoise`.
+
+    Returns a data frame with the columns *site*, *sitekey*, *wildtype*,
+    *mutation*, *noise* (root mean square *log2ratio* over pairs, but at least the root
+    mean *poissonvar*), *testable* (whether the mutation has counts in any
+    mock), and *foldfloor*, the fold change
+    :math:`2^{\\rm{nsigma} \\times \\rm{noise}}` of the fraction surviving
+    over the library fraction surviving that is within the noise. The
+    *noise* and *foldfloor* of mutations that are not testable are `NaN`.
+    '''
+    floor = (noise
+             .assign(sq=noise['log2ratio']**2)
+             .groupby(['site', 'sitekey', 'wildtype', 'mutation'], sort=False)
+             .agg({'sq':'mean', 'poissonvar':'mean', 'counts':'sum'})
+             .reset_index()
+             )
+    testable = floor['counts'] > 0
+    floor = floor.assign(
+            noise=numpy.sqrt(numpy.maximum(floor['sq'], floor['poissonvar']))
+                  .where(testable),
+            testable=testable)
+    return (floor.assign(foldfloor=2**(nsigma * floor['noise']))
+            [['site', 'sitekey', 'wildtype', 'mutation', 'noise', 'testable',
+              'foldfloor']])
+
+
+def aboveNoiseFloor(mutfracsurvive, libfracsurvive, floor):
+    '''Marks mutations whose fraction surviving is above the noise floor.
+
+    *mutfracsurvive* is a data frame like the ``*_mutfracsurvive.csv`` files
+    (not above average), *libfracsurvive* is the library fraction surviving
+    of that sample, and *floor* is from :func:`noiseFloor`. The two are
+    joined on the integer *sitekey*, which is added to *mutfracsurvive* if it
+    does not have it. Returns *mutfracsurvive* with the added columns
+    *foldfloor* and *abovenoise*, which is `False` for mutations that are not
+    testable.
+    '''
+    if 'sitekey' not in mutfracsurvive.columns:
+        mutfracsurvive = mutfracsurvive.assign(
+                sitekey=siteKeys(mutfracsurvive['site']))
+    df = mutfracsurvive.merge(floor[['sitekey', 'mutation', 'foldfloor']],
+            on=['sitekey', 'mutation'], how='left')
+    return df.assign(abovenoise=df['mutfracsurvive'] >
+                     libfracsurvive * df['foldfloor'])
@@ -0,0 +1,172 @@
+'''Exports the results directories to partitioned Parquet datasets.
+
+Each CSV in ``results/codoncounts``, ``results/renumberedcounts``,
+``results/fracsurvive``, and ``results/fracsurviveaboveavg`` is appended to a
+Parquet dataset with hive-style partition directories, one file at a time:
+
+  * codon counts are partitioned by *antibody*, *concentration*, and
+    *sample*, using the sample information in ``data/samples.csv``;
+
+  * fracsurvive results are written to a *mutfracsurvive* and a
+    *sitefracsurvive* dataset partitioned by *antibody*, *concentration*,
+    and *replicate*.
+
+The *site*, *wildtype*, and *mutation* columns are dictionary encoded, and
+a *sitekey* column holds the integer key of each site (see
+``escapetools.sites``) for fast sorting and joining.
+:func:`readDataset` reads a dataset back, using the filters to skip
+partitions and row groups that cannot match.
+
+Export the results from the ``analysis_code`` directory with::
+
+    python -m escapetools.parquetexport --outdir ./results/parquet/
+
+Requires `pyarrow <https://arrow.apache.org/docs/python/>`_, which unlike
+the rest of ``escapetools`` is not installed with ``dms_tools2``.
+'''
+
+
+import os
+import glob
+import argparse
+
+import pandas
+import pyarrow
+import pyarrow.parquet
+import pyarrow.dataset
+
+from escapetools.filenames import parseFracSurviveFile, parseCodonCountsFile
+from escapetools.sites import siteKeys
+
+DICTIONARY_COLS = ['site', 'wildtype', 'mutation']
+COUNTS_PARTITIONS = ['antibody', 'concentration', 'sample']
+FRACSURVIVE_PARTITIONS = ['antibody', 'concentration', 'replicate']
+
+
+def _appendToDataset(df, outdir, partition_cols, basename):
+    '''Appends *df* to the Parquet dataset in *outdir*.
+
+    The files written are named from *basename*, so re-exporting the same
+    input replaces its earlier output rather than duplicating it.
+    '''
+    if 'site' in df.columns:
+        df['sitekey'] = siteKeys(df['site'])
+    for col in DICTIONARY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype('category')
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    pyarrow.parquet.write_to_dataset(table, outdir,
+            partition_cols=partition_cols,
+            basename_template=basename + '-{i}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            use_dictionary=[c for c in DICTIONARY_COLS if c in df.columns])
+
+
+def exportCodonCounts(countsdir, samples, outdir):
+    '''Exports the ``*_codoncounts.csv`` files in *countsdir* to *outdir*.
+
+    *samples* is the data frame from ``data/samples.csv`` giving the
+    *antibody* and *ug/ml_Ab* of each sample *name*. Returns the number of
+    files exported.
+    '''
+    info = samples.set_index('name')
+    n = 0
+    for f in sorted(glob.glob(os.path.join(countsdir, '*_codoncounts.csv'))):
+        sample = parseCodonCountsFile(f)
+        if sample not in info.index:
+            raise ValueError("sample {0} for {1} not in samples".format(
+                    sample, f))
+        df = pandas.read_csv(f, dtype={'site':str}).assign(
+                antibody=info.at[sample, 'antibody'],
+                concentration=str(info.at[sample, 'ug/ml_Ab']),
+                sample=sample)
+        _appendToDataset(df, outdir, COUNTS_PARTITIONS, sample)
+        n += 1
+    return n
+
+
+def exportFracSurvive(fracsurvivedir, outdir):
+    '''Exports the per-replicate fracsurvive files in *fracsurvivedir*.
+
+    Mutation and site files go to the *mutfracsurvive* and
+    *sitefracsurvive* subdirectories of *outdir*. Returns the number of
+    files exported.
+    '''
+    n = 0
+    for f in sorted(glob.glob(os.path.join(fracsurvivedir,
+            '*fracsurvive.csv'))):
+        info = parseFracSurviveFile(f)
+        if info is None:
+            continue
+        df = pandas.read_csv(f, dtype={'site':str}).assign(
+                antibody=info['antibody'],
+                concentration=info['concentration'],
+                replicate=info['replicate'])
+        _appendToDataset(df,
+                os.path.join(outdir, '{0}fracsurvive'.format(info['kind'])),
+                FRACSURVIVE_PARTITIONS,
+                '{0}-{1}'.format(info['group'], info['replicate']))
+        n += 1
+    return n
+
+
+def exportResults(resultsdir, samples, outdir):
+    '''Exports all results subdirectories of *resultsdir* under *outdir*.
+
+    Returns a dict mapping each exported subdirectory to its file count.
+    '''
+    exported = {}
+    for subdir in ['codoncounts', 'renumberedcounts']:
+        exported[subdir] = exportCodonCounts(os.path.join(resultsdir, subdir),
+                samples, os.path.join(outdir, subdir))
+    for subdir in ['fracsurvive', 'fracsurviveaboveavg']:
+        exported[subdir] = exportFracSurvive(os.path.join(resultsdir, subdir),
+                os.path.join(outdir, subdir))
+    return exported
+
+
+def readDataset(datasetdir, filters=None, columns=None):
+    '''Reads a dataset written by this module into a data frame.
+
+    *filters* is a dict mapping column names to a value or a list of
+    allowed values, for instance `{'antibody':'FI6v3', 'site':['280']}`.
+    Filters on partition columns skip whole directories, and filters on
+    other columns are checked against the row-group statistics before any
+    data are read. *columns* optionally restricts which columns are read.
+    '''
+    dataset = pyarrow.dataset.dataset(datasetdir, format='parquet',
+            partitioning='hive')
+    expression = None
+    for col, values in (filters or {}).items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        field = pyarrow.dataset.field(col)
+        values = [str(v) for v in values] if \
+                pyarrow.types.is_dictionary(dataset.schema.field(col).type) or \
+                pyarrow.types.is_string(dataset.schema.field(col).type) \
+                else list(values)
+        condition = field.isin(values)
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(filter=expression, columns=columns).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--resultsdir', default='./results/',
+            help='directory with the codoncounts, renumberedcounts, '
+                 'fracsurvive, and fracsurviveaboveavg subdirectories')
+    parser.add_argument('--samples', default='./data/samples.csv',
+            help='CSV giving the antibody and ug/ml_Ab of each sample')
+    parser.add_argument('--outdir', default='./results/parquet/',
+            help='directory for the Parquet datasets')
+    args = parser.parse_args()
+
+    exported = exportResults(args.resultsdir, pandas.read_csv(args.samples),
+            args.outdir)
+    for subdir, n in exported.items():
+        print("Exported {0} files from {1} to {2}".format(n, subdir,
+                os.path.join(args.outdir, subdir)))
+
+
+if __name__ == '__main__':
+    main()
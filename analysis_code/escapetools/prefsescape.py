@@ -0,0 +1,144 @@
+'''Joins amino-acid preferences with the escape from each antibody.
+
+A :class:`PrefsEscapeTable` has a row for every site and amino acid giving
+the preference of WSN HA for that amino acid (as measured by Doud and Bloom,
+2016), the preference for the wildtype amino acid at that site, and the
+mutation fraction surviving of each antibody. Sites are converted to
+integer site keys once, so the preferences and the escape of every antibody
+are placed into site-by-amino-acid arrays and joined without any merges
+on the site labels. Queries for escape mutations that are tolerated by HA
+are then simple filters of one table.
+'''
+
+
+import os
+
+import numpy
+import pandas
+
+from escapetools.sites import siteKeys, siteLabels
+from escapetools.filenames import medianFileAntibodies
+
+#: amino acids in the column order of the preferences file
+AAS = list('ACDEFGHIKLMNPQRSTVWY')
+
+#: columns of the table before the antibody columns
+TABLE_COLS = ['site', 'sitekey', 'wildtype', 'mutation', 'preference',
+              'wildtypepreference']
+
+
+class PrefsEscapeTable(object):
+    '''Table of preferences and mutation fraction surviving of antibodies.
+
+    *prefs* is a data frame of amino-acid preferences with a *site* column
+    and a column for each amino acid, and *escape* is a dict keyed by
+    antibody of data frames with the columns *site*, *wildtype*, *mutation*,
+    and *mutfracsurvive*. The table is in the attribute *df*, with the
+    columns *site*, *sitekey* (see ``escapetools.sites``), *wildtype*,
+    *mutation*, *preference*, *wildtypepreference*, and one column named by
+    each antibody. Rows are in sequence order, and values missing from the
+    inputs are `NaN`. Mutations to characters other than :data:`AAS`, such
+    as stop codons, are ignored.
+    '''
+
+    def __init__(self, prefs, escape):
+        self.antibodies = list(escape.keys())
+        escape = dict((ab, df[df['mutation'].isin(AAS)]) for ab, df in
+                escape.items())
+        prefkeys = siteKeys(prefs['site'])
+        escapekeys = dict((ab, siteKeys(df['site'])) for ab, df in
+                escape.items())
+
+        # integer keys of every site, in sequence order
+        sitekeys = pandas.Index(numpy.unique(numpy.concatenate(
+                [prefkeys] + list(escapekeys.values()))))
+        self.sites = list(siteLabels(sitekeys))
+        nsites = len(sitekeys)
+        aas = pandas.Index(AAS)
+
+        preference = numpy.full((nsites, len(AAS)), numpy.nan)
+        preference[sitekeys.get_indexer(prefkeys)] = prefs[AAS].values
+        wildtype = numpy.full(nsites, '', dtype=object)
+        columns = {}
+        for ab, df in escape.items():
+            isite = sitekeys.get_indexer(escapekeys[ab])
+            wildtype[isite] = df['wildtype'].values
+            values = numpy.full((nsites, len(AAS)), numpy.nan)
+            values[isite, aas.get_indexer(df['mutation'])] = \
+                    df['mutfracsurvive'].values
+            columns[ab] = values.ravel()
+
+        iwt = aas.get_indexer(wildtype)
+        wtpref = numpy.where(iwt >= 0, preference[numpy.arange(nsites),
+                numpy.maximum(iwt, 0)], numpy.nan)
+        self.df = pandas.DataFrame(dict([
+                ('site', numpy.repeat(self.sites, len(AAS))),
+                ('sitekey', numpy.repeat(sitekeys.values, len(AAS))),
+                ('wildtype', numpy.repeat(wildtype, len(AAS))),
+                ('mutation', numpy.tile(AAS, nsites)),
+                ('preference', preference.ravel()),
+                ('wildtypepreference', numpy.repeat(wtpref, len(AAS))),
+                ] + [(ab, columns[ab]) for ab in self.antibodies]))
+
+    @classmethod
+    def fromFiles(cls, prefsfile, medianfiles, cachefile=None,
+            use_existing=False):
+        '''Builds the table from a preferences file and antibody median files.
+
+        *medianfiles* are ``antibody_<Ab>_median.csv`` files. If *cachefile*
+        is given, the table is written to it, and if *use_existing* is `True`
+        and *cachefile* exists, is newer than all the input files, and has
+        the same antibodies then it is read from there instead.
+        '''
+        antibodies = medianFileAntibodies(medianfiles)
+        if cachefile and use_existing and os.path.isfile(cachefile) and (
+                os.path.getmtime(cachefile) >= max(os.path.getmtime(f) for
+                f in [prefsfile] + list(medianfiles))):
+            table = cls.load(cachefile)
+            if table.antibodies == antibodies:
+                return table
+        table = cls(pandas.read_csv(prefsfile),
+                dict((ab, pandas.read_csv(f)) for
+                ab, f in zip(antibodies, medianfiles)))
+        if cachefile:
+            table.save(cachefile)
+        return table
+
+    def save(self, cachefile):
+        '''Writes the table to the CSV file *cachefile*.'''
+        self.df.to_csv(cachefile, index=False)
+
+    @classmethod
+    def load(cls, cachefile):
+        '''Reads a table written by :meth:`save`.
+
+        The antibodies are all columns other than :data:`TABLE_COLS`, and
+        the *sitekey* column is added if the file does not have it.
+        '''
+        table = cls.__new__(cls)
+        df = pandas.read_csv(cachefile, dtype={'site':str})
+        table.antibodies = [c for c in df.columns if c not in TABLE_COLS]
+        if 'sitekey' not in df.columns:
+            df['sitekey'] = siteKeys(df['site'])
+        table.df = df[TABLE_COLS + table.antibodies]
+        table.sites = list(table.df['site'].unique())
+        return table
+
+    def accessibleEscape(self, antibody, minfracsurvive=0,
+            minprefratio=1.0):
+        '''Escape mutations from *antibody* that HA tolerates.
+
+        Returns the amino-acid mutations with a mutation fraction surviving
+        of at least *minfracsurvive* and a preference that is at least
+        *minprefratio* times the preference for the wildtype amino acid,
+        sorted by decreasing fraction surviving.
+        '''
+        df = self.df
+        keep = ((df['mutation'] != df['wildtype']) &
+                (df[antibody] >= minfracsurvive) &
+                (df['preference'] >= minprefratio * df['wildtypepreference']))
+        return (df.loc[keep, ['site', 'wildtype', 'mutation', 'preference',
+                        'wildtypepreference', antibody]]
+                .sort_values(antibody, ascending=False)
+                .reset_index(drop=True)
+                )
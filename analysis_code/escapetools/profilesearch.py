@@ -0,0 +1,126 @@
+'''Finds antibodies with similar site escape profiles.
+
+A site escape profile is the *avgfracsurvive* (or *maxfracsurvive*) of each
+site in an ``antibody_<Ab>_median_avgsite.csv`` file. A
+:class:`SiteProfileIndex` stores the profiles of a library of antibodies as
+rows of one matrix over the union of their sites. Each row is centered on
+its median (the background fraction surviving at sites without escape) and
+scaled to unit length, so the similarity of a new profile to every antibody
+in the library is one matrix-vector product.
+'''
+
+
+import os
+import glob
+
+import numpy
+import pandas
+
+from escapetools.sites import siteKeys, siteLabels
+from escapetools.filenames import parseMedianFile
+
+
+def _normalize(matrix):
+    '''Centers rows of *matrix* on their medians and scales to unit length.'''
+    matrix = matrix - numpy.median(matrix, axis=1, keepdims=True)
+    norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class SiteProfileIndex(object):
+    '''Index of antibody site escape profiles for similarity queries.
+
+    *profiles* is a dict keyed by antibody name with values that are data
+    frames with a *site* column and a *statistic* column.
+    '''
+
+    def __init__(self, profiles, statistic='avgfracsurvive'):
+        self.statistic = statistic
+        self.antibodies = list(profiles.keys())
+        # sites are indexed by their integer keys, in sequence order
+        df = pandas.concat([p.set_index(siteKeys(p['site']))[statistic]
+                .rename(ab) for ab, p in profiles.items()], axis=1, sort=True)
+        self._sitekeys = df.index
+        self.sites = list(siteLabels(df.index))
+        # sites missing from a profile get that profile's median
+        df = df.fillna(df.median())
+        self._matrix = _normalize(df.values.T)
+
+    @classmethod
+    def fromFiles(cls, filepattern, statistic='avgfracsurvive'):
+        '''Builds an index from files matching *filepattern*.
+
+        The antibody name is taken from file names of the form
+        ``antibody_<Ab>_median_avgsite.csv``, and otherwise is the file
+        name without its extension.
+        '''
+        profiles = {}
+        for f in sorted(glob.glob(filepattern)):
+            info = parseMedianFile(f)
+            if info is not None and info['kind'] == 'site':
+                antibody = info['antibody']
+            else:
+                antibody = os.path.splitext(os.path.basename(f))[0]
+            profiles[antibody] = pandas.read_csv(f)
+        if not profiles:
+            raise ValueError("no files match {0}".format(filepattern))
+        return cls(profiles, statistic)
+
+    def save(self, npzfile):
+        '''Saves the index to the numpy ``.npz`` file *npzfile*.'''
+        numpy.savez(npzfile, matrix=self._matrix,
+                antibodies=numpy.array(self.antibodies),
+                sites=numpy.array(self.sites),
+                statistic=numpy.array(self.statistic))
+
+    @classmethod
+    def load(cls, npzfile):
+        '''Loads an index saved with :meth:`save`.'''
+        data = numpy.load(npzfile)
+        index = cls.__new__(cls)
+        index.statistic = str(data['statistic'])
+        index.antibodies = list(data['antibodies'])
+        index.sites = list(data['sites'])
+        index._sitekeys = pandas.Index(siteKeys(index.sites))
+        index._matrix = data['matrix']
+        return index
+
+    def _queryVector(self, profile):
+        '''Normalized vector for *profile* over the sites of the index.'''
+        values = profile[self.statistic].values
+        positions = self._sitekeys.get_indexer(siteKeys(profile['site']))
+        shared = positions >= 0
+        if not shared.any():
+            raise ValueError("profile has no sites in common with the index")
+        vector = numpy.full(len(self.sites), numpy.median(values))
+        vector[positions[shared]] = values[shared]
+        return _normalize(vector[None, : ])[0]
+
+    def similarities(self, profile):
+        '''Cosine similarity of *profile* to every antibody in the index.
+
+        *profile* is a data frame like the ``*_median_avgsite.csv`` files.
+        Returns a series indexed by antibody.
+        '''
+        return pandas.Series(self._matrix.dot(self._queryVector(profile)),
+                index=self.antibodies, name='similarity')
+
+    def similarityMatrix(self):
+        '''Data frame of similarities between all antibodies in the index.'''
+        return pandas.DataFrame(self._matrix.dot(self._matrix.T),
+                index=self.antibodies, columns=self.antibodies)
+
+    def nearest(self, profile, k=5):
+        '''The *k* antibodies with profiles most similar to *profile*.
+
+        Returns a data frame with the columns *antibody* and *similarity*
+        sorted from most to least similar.
+        '''
+        sims = self._matrix.dot(self._queryVector(profile))
+        k = min(k, len(sims))
+        top = numpy.argpartition(-sims, k - 1)[ : k]
+        top = top[numpy.argsort(-sims[top])]
+        return pandas.DataFrame({
+                'antibody':[self.antibodies[i] for i in top],
+                'similarity':sims[top]})
@@ -0,0 +1,195 @@
+'''Quality-control summaries of the codon counts of all samples.
+
+``dms2_batch_bcsubamp`` draws summary plots of the depth, mutation frequency,
+codon mutation types, and nucleotide changes by re-reading the counts file
+of every sample for each plot. Here the counts of all samples are instead
+taken as one ``escapetools.countarrays.CodonCounts`` array. Every pair of
+wildtype and mutant codons is classified once in a `(64, 64, class)`
+indicator array, so the counts of every class at every site of every sample
+are computed in a single pass by indexing this array with the wildtype
+codon of each site. The summaries are written as tables, and the plots are
+drawn from the tables.
+
+The read and barcode statistics (``summary_readstats.pdf``,
+``summary_readsperbc.pdf``, and ``summary_bcstats.pdf``) describe reads
+rather than codon counts, so they are not computed here.
+'''
+
+
+import math
+
+import numpy
+import pandas
+import matplotlib.pyplot as plt
+
+from escapetools.countarrays import CODONS, CODON_TO_AA
+
+MUTTYPES = ['synonymous', 'nonsynonymous', 'stop']
+NTCHANGES = ['1', '2', '3']
+SINGLENTCHANGES = ['{0}to{1}'.format(a, b) for a in 'ACGT' for b in 'ACGT'
+                   if a != b]
+#: codon classes, in the order of the last axis of :func:`codonClasses`
+CLASSES = ['wildtype'] + MUTTYPES + NTCHANGES + SINGLENTCHANGES
+
+
+def codonClasses():
+    '''Indicator array of the classes of codon mutations.
+
+    Element `[w, c, k]` is 1 if mutating wildtype codon `CODONS[w]` to
+    codon `CODONS[c]` is in class `CLASSES[k]`.
+    '''
+    classes = numpy.zeros((len(CODONS), len(CODONS), len(CLASSES)), dtype=int)
+    for w, wt in enumerate(CODONS):
+        for c, codon in enumerate(CODONS):
+            if codon == wt:
+                classes[w, c, CLASSES.index('wildtype')] = 1
+                continue
+            if CODON_TO_AA[codon] == '*':
+                muttype = 'stop'
+            elif CODON_TO_AA[codon] == CODON_TO_AA[wt]:
+                muttype = 'synonymous'
+            else:
+                muttype = 'nonsynonymous'
+            classes[w, c, CLASSES.index(muttype)] = 1
+            diffs = [(a, b) for a, b in zip(wt, codon) if a != b]
+            classes[w, c, CLASSES.index(str(len(diffs)))] = 1
+            if len(diffs) == 1:
+                classes[w, c, CLASSES.index('{0}to{1}'.format(*diffs[0]))] = 1
+    return classes
+
+
+class QCSummary(object):
+    '''Counts of each codon class at each site of each sample.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts``.
+    '''
+
+    def __init__(self, codoncounts):
+        self.samples = codoncounts.samples
+        self.sites = codoncounts.sites
+        sitemasks = codonClasses()[codoncounts.wildtypeCodonIndex()]
+        # counts of each class, shape (sample, site, class)
+        self.classcounts = numpy.einsum('nsc,sck->nsk', codoncounts.counts,
+                sitemasks)
+        self.depth = codoncounts.counts.sum(axis=-1)
+
+    def _sampleFreqs(self, classes):
+        '''Frequencies of *classes* in each sample, averaged over sites.'''
+        icols = [CLASSES.index(c) for c in classes]
+        freqs = (self.classcounts[..., icols].sum(axis=1) /
+                 self.depth.sum(axis=1)[ : , None])
+        return pandas.DataFrame(freqs, columns=classes).assign(
+                sample=self.samples)[['sample'] + classes]
+
+    def siteTable(self):
+        '''Data frame of the *depth* and *mutfreq* of each site of each sample.'''
+        wildtype = self.classcounts[..., CLASSES.index('wildtype')]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            mutfreq = 1 - wildtype / self.depth
+        return pandas.DataFrame({
+                'sample':numpy.repeat(self.samples, len(self.sites)),
+                'site':numpy.tile(self.sites, len(self.samples)),
+                'depth':self.depth.ravel(),
+                'mutfreq':mutfreq.ravel(),
+                })
+
+    def codonMutTypes(self):
+        '''Frequency of each codon mutation type in each sample.'''
+        return self._sampleFreqs(MUTTYPES)
+
+    def codonNTChanges(self):
+        '''Frequency of codon mutations by number of nucleotide changes.'''
+        return self._sampleFreqs(NTCHANGES)
+
+    def singleNTChanges(self):
+        '''Frequency of each kind of single-nucleotide codon mutation.'''
+        return self._sampleFreqs(SINGLENTCHANGES)
+
+    def writeTables(self, prefix):
+        '''Writes the summary tables to CSV files starting with *prefix*.
+
+        Returns a dict mapping ``sites``, ``codonmuttypes``,
+        ``codonntchanges``, and ``singlentchanges`` to the files.
+        '''
+        files = {}
+        for name, df in [('sites', self.siteTable()),
+                         ('codonmuttypes', self.codonMutTypes()),
+                         ('codonntchanges', self.codonNTChanges()),
+                         ('singlentchanges', self.singleNTChanges())]:
+            files[name] = '{0}{1}.csv'.format(prefix, name)
+            df.to_csv(files[name], index=False)
+        return files
+
+
+def plotSiteTable(sitetable, column, plotfile, ncol=4):
+    '''Plots *column* (``depth`` or ``mutfreq``) against site for each sample.
+
+    *sitetable* is a data frame from :meth:`QCSummary.siteTable`. There is
+    one panel per sample, with sites in the order of the table.
+    '''
+    samples = list(sitetable['sample'].unique())
+    nrow = int(math.ceil(len(samples) / float(ncol)))
+    fig, axes = plt.subplots(nrow, ncol, sharex=True, sharey=True,
+            figsize=(3 * ncol, 1.8 * nrow), squeeze=False)
+    for ax, (sample, df) in zip(axes.ravel(), sitetable.groupby('sample',
+            sort=False)):
+        ax.plot(numpy.arange(len(df)), df[column].values, lw=1,
+                color='#1f77b4')
+        ax.set_title(sample, fontsize=9)
+    for i in range(len(samples), nrow * ncol):
+        axes.ravel()[i].set_visible(False)
+        # label the x-axis of the panel above an empty one, if there is one
+        if i >= ncol:
+            axes.ravel()[i - ncol].tick_params(labelbottom=True)
+            axes.ravel()[i - ncol].set_xlabel('site')
+    for ax in axes[-1]:
+        ax.set_xlabel('site')
+    for ax in axes[ : , 0]:
+        ax.set_ylabel(column)
+    fig.tight_layout()
+    fig.savefig(plotfile)
+    plt.close(fig)
+
+
+def plotSampleFreqs(freqs, plotfile, ylabel='frequency'):
+    '''Grouped bar plot of a per-sample frequency table.
+
+    *freqs* is a data frame such as from :meth:`QCSummary.codonMutTypes`,
+    with a *sample* column and one column per class.
+    '''
+    classes = [c for c in freqs.columns if c != 'sample']
+    x = numpy.arange(len(freqs))
+    width = 0.8 / len(classes)
+    fig, ax = plt.subplots(figsize=(max(6, 0.25 * len(freqs)) + 1.5, 3.5))
+    for i, c in enumerate(classes):
+        ax.bar(x + (i - (len(classes) - 1) / 2.0) * width, freqs[c].values,
+                width, label=c)
+    ax.set_xticks(x)
+    ax.set_xticklabels(freqs['sample'], rotation=90, fontsize=8)
+    ax.set_xlim(-0.5, len(freqs) - 0.5)
+    ax.set_ylabel(ylabel)
+    ax.legend(fontsize=8, loc='center left', bbox_to_anchor=(1, 0.5),
+            frameon=False)
+    fig.tight_layout()
+    fig.savefig(plotfile)
+    plt.close(fig)
+
+
+def plotQCSummary(files, prefix):
+    '''Draws the plots from the tables written by :meth:`QCSummary.writeTables`.
+
+    *files* is the dict returned by that method, and the plots are written
+    to PDFs starting with *prefix*. Returns a dict of the plot files.
+    '''
+    plots = {}
+    sitetable = pandas.read_csv(files['sites'], dtype={'site':str})
+    for column in ['depth', 'mutfreq']:
+        plots[column] = '{0}{1}.pdf'.format(prefix, column)
+        plotSiteTable(sitetable, column, plots[column])
+    for name, ylabel in [
+            ('codonmuttypes', 'mutation frequency'),
+            ('codonntchanges', 'mutation frequency'),
+            ('singlentchanges', 'mutation frequency')]:
+        plots[name] = '{0}{1}.pdf'.format(prefix, name)
+        plotSampleFreqs(pandas.read_csv(files[name]), plots[name], ylabel)
+    return plots
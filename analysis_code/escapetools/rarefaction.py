@@ -0,0 +1,173 @@
+'''Rarefaction of the codon counts to test whether samples are deep enough.
+
+For each row of the fracsurvive batch, the codon counts of the selected and
+mock samples are downsampled to each of a grid of mean per-site depths, and
+the fraction surviving is recomputed from the downsampled counts. Reads are
+kept independently with the probability that gives the target depth, so
+every depth and every random draw of a sample is one binomial draw over a
+`(depth, draw, site, codon)` array, and the fraction surviving of all of
+them is computed at once with ``escapetools.countarrays``. The counts of
+the error control are not downsampled.
+
+The stability of the site profile at each depth is the Pearson correlation
+of the site average fraction surviving with that at the full depth (over
+the sites without a wildtype stop codon, as in the site files), and the
+fraction of the top sites at the full depth that are still among the top
+sites. A sample is deep enough if the profile is already stable at a depth
+well below its actual depth.
+'''
+
+
+import concurrent.futures
+
+import numpy
+import pandas
+
+from escapetools.countarrays import (errorCorrect, aaCounts, fracSurvive,
+        avgFracSurvive, codingSites, PSEUDOCOUNT)
+
+#: default grid of mean per-site depths
+DEPTHS = [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000]
+
+
+def downsampleCounts(counts, fractions, ndraws, rng):
+    '''Downsamples *counts* of shape `(site, codon)` to each of *fractions*.
+
+    Each read is kept with probability given by the fraction. *rng* is a
+    ``numpy.random.Generator``. Returns an array of shape
+    `(fraction, ndraws, site, codon)`.
+    '''
+    fractions = numpy.minimum(1, numpy.asarray(fractions, dtype='float'))
+    return rng.binomial(counts, fractions.reshape(-1, 1, 1, 1),
+            size=(len(fractions), ndraws) + counts.shape)
+
+
+def _profileStability(profiles, full, ntop):
+    '''Correlation and top-site overlap of *profiles* with the profile *full*.
+
+    *profiles* has shape `(..., site)`. Returns two arrays of shape `(...)`.
+    '''
+    centered = profiles - profiles.mean(axis=-1, keepdims=True)
+    fullcentered = full - full.mean()
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        corr = ((centered * fullcentered).sum(axis=-1) /
+                numpy.sqrt((centered**2).sum(axis=-1) *
+                           (fullcentered**2).sum()))
+    fulltop = numpy.argsort(-full, kind='mergesort')[ : ntop]
+    top = numpy.argsort(-profiles, axis=-1, kind='mergesort')[..., : ntop]
+    overlap = numpy.isin(top, fulltop).sum(axis=-1) / float(ntop)
+    return corr, overlap
+
+
+def _rarefyRow(job):
+    '''Rarefies one row of the batch; runs in a worker process.'''
+    (selcounts, mockcounts, errcounts, wtindex, wildtype, libfracsurvive,
+            depths, ndraws, ntop, pseudocount, aboveavg, seed) = job
+    rng = numpy.random.default_rng(seed)
+    corrected = []
+    depthfracs = {}
+    for name, counts in [('sel', selcounts), ('mock', mockcounts)]:
+        depthfracs[name] = numpy.minimum(1, numpy.asarray(depths) /
+                counts.sum(axis=-1).mean())
+        corrected.append(errorCorrect(downsampleCounts(counts,
+                depthfracs[name], ndraws, rng), errcounts, wtindex))
+        corrected.append(errorCorrect(counts, errcounts, wtindex))
+    sel, selfull, mock, mockfull = corrected
+    f = fracSurvive(aaCounts(sel), aaCounts(mock), libfracsurvive,
+            pseudocount)
+    ffull = fracSurvive(aaCounts(selfull), aaCounts(mockfull), libfracsurvive,
+            pseudocount)
+    if aboveavg:
+        f = numpy.maximum(0, f - libfracsurvive)
+        ffull = numpy.maximum(0, ffull - libfracsurvive)
+    keep = codingSites(wildtype)
+    corr, overlap = _profileStability(avgFracSurvive(f, wildtype)[..., keep],
+            avgFracSurvive(ffull, wildtype)[keep], ntop)
+    return (depthfracs['sel'], depthfracs['mock'], corr, overlap,
+            selcounts.sum(axis=-1).mean(), mockcounts.sum(axis=-1).mean())
+
+
+def rarefactionBatch(codoncounts, batch, depths=DEPTHS, ndraws=5, ntop=10,
+        seed=1, ncpus=1, pseudocount=PSEUDOCOUNT, aboveavg=True):
+    '''Stability of the site profiles of a fracsurvive batch across depths.
+
+    *codoncounts* is an ``escapetools.countarrays.CodonCounts`` of the raw
+    counts, and *batch* is the ``fracsurvivebatch`` data frame with the
+    columns *group*, *name*, *sel*, *mock*, *err*, and *libfracsurvive*.
+    Each row is downsampled *ndraws* times to each mean per-site depth in
+    *depths*, with rows spread over *ncpus* processes. Each row gets its own
+    random seed spawned from *seed*, so the results do not depend on
+    *ncpus*. Site profiles are of the fraction surviving above average if
+    *aboveavg* is `True`.
+
+    Returns a data frame with one row per batch row, depth, and *draw*
+    giving the *group*, *name*, target *depth*, the fractions of reads kept
+    (*selfraction* and *mockfraction*), the actual mean per-site depths
+    (*seldepth* and *mockdepth*), and the stability of the site profile
+    (*sitecorr* and *topsiteoverlap* for the top *ntop* sites).
+    '''
+    seeds = numpy.random.SeedSequence(seed).spawn(len(batch))
+    wtindex = codoncounts.wildtypeCodonIndex()
+    wildtype = codoncounts.wildtypeAA()
+    jobs = [(codoncounts[row.sel], codoncounts[row.mock],
+             codoncounts[row.err], wtindex, wildtype, row.libfracsurvive,
+             depths, ndraws, ntop, pseudocount, aboveavg, rowseed)
+            for row, rowseed in zip(batch.itertuples(index=False), seeds)]
+    if ncpus > 1:
+        with concurrent.futures.ProcessPoolExecutor(ncpus) as executor:
+            results = list(executor.map(_rarefyRow, jobs))
+    else:
+        results = list(map(_rarefyRow, jobs))
+
+    dfs = []
+    for row, (selfrac, mockfrac, corr, overlap, seldepth, mockdepth) in zip(
+            batch.itertuples(index=False), results):
+        dfs.append(pandas.DataFrame({
+                'group':row.group,
+                'name':row.name,
+                'depth':numpy.repeat(depths, ndraws),
+                'draw':numpy.tile(numpy.arange(ndraws), len(depths)),
+                'selfraction':numpy.repeat(selfrac, ndraws),
+                'mockfraction':numpy.repeat(mockfrac, ndraws),
+                'seldepth':seldepth,
+                'mockdepth':mockdepth,
+                'sitecorr':corr.ravel(),
+                'topsiteoverlap':overlap.ravel(),
+                }))
+    return pandas.concat(dfs, ignore_index=True)
+
+
+def depthSufficiency(rarefaction, mincorr=0.98):
+    '''Smallest depth from which each sample's site profile stays stable.
+
+    *rarefaction* is a data frame from :func:`rarefactionBatch`. Returns a
+    data frame with one row per *group* and *name* giving the actual
+    *seldepth*, the smallest target depth below it such that the mean
+    *sitecorr* over draws is at least *mincorr* at that and every larger
+    target depth below *seldepth* (`NaN` if there is none), and the mean
+    *sitecorr* and *topsiteoverlap* at that depth.
+    '''
+    means = (rarefaction
+             .groupby(['group', 'name', 'depth'], sort=False)
+             .agg({'seldepth':'first', 'sitecorr':'mean',
+                   'topsiteoverlap':'mean'})
+             .reset_index()
+             )
+    below = (means[means['depth'] < means['seldepth']]
+             .sort_values('depth', ascending=False, kind='mergesort')
+             )
+    # whether the profile is stable at this and every larger depth
+    below = below.assign(stable=(below['sitecorr'] < mincorr)
+            .groupby([below['group'], below['name']]).cumsum() == 0)
+    sufficient = (below[below['stable']]
+                  .sort_values('depth', kind='mergesort')
+                  .drop_duplicates(['group', 'name'])
+                  .drop(columns='stable')
+                  .rename(columns={'depth':'sufficientdepth'})
+                  )
+    return (means[['group', 'name', 'seldepth']]
+            .drop_duplicates(['group', 'name'])
+            .merge(sufficient.drop(columns='seldepth'), on=['group', 'name'],
+                   how='left')
+            .reset_index(drop=True)
+            )
@@ -0,0 +1,113 @@
+'''Correlations between replicates of the site fraction surviving.
+
+``dms2_batch_fracsurvive`` draws a ``summary_<group>-avgfracsurvivecorr.pdf``
+for every group, but the correlations themselves are not saved. Here the
+Pearson and Spearman correlations of *avgfracsurvive* and *maxfracsurvive*
+between every pair of replicates in every group are computed from one
+site-by-replicate matrix and stored as a table, which is then used for
+plotting.
+'''
+
+
+import os
+import itertools
+
+import numpy
+import pandas
+import matplotlib.pyplot as plt
+
+STATISTICS = ['avgfracsurvive', 'maxfracsurvive']
+METHODS = ['pearson', 'spearman']
+
+
+def siteFracSurviveMatrix(fracsurvivedir, batch, statistic):
+    '''Site-by-replicate matrix of *statistic* for all rows of *batch*.
+
+    *batch* is the ``fracsurvivebatch`` data frame (with the columns
+    *group* and *name*) and *fracsurvivedir* the directory with the
+    ``<group>-<name>_sitefracsurvive.csv`` files. The columns of the
+    returned data frame are a (group, name) multi-index and the rows are
+    the sites that are in all files.
+    '''
+    columns = []
+    for group, name in batch[['group', 'name']].itertuples(index=False):
+        f = os.path.join(fracsurvivedir,
+                '{0}-{1}_sitefracsurvive.csv'.format(group, name))
+        columns.append(pandas.read_csv(f, index_col='site')[statistic]
+                       .rename((group, name)))
+    df = pandas.concat(columns, axis=1, join='inner')
+    df.columns = pandas.MultiIndex.from_tuples(df.columns,
+            names=['group', 'name'])
+    return df
+
+
+def _corrMatrix(values, method):
+    '''Correlations between all pairs of columns of the array *values*.'''
+    if method == 'spearman':
+        values = pandas.DataFrame(values).rank().values
+    elif method != 'pearson':
+        raise ValueError("invalid method {0}".format(method))
+    return numpy.corrcoef(values, rowvar=False)
+
+
+def replicateCorrelations(fracsurvivedir, batch, corrfile=None,
+        use_existing=False):
+    '''Correlations of site fraction surviving between replicates.
+
+    Computes the correlation of each statistic in `STATISTICS` by each
+    method in `METHODS` for every pair of replicates in the same group.
+    If *corrfile* is given, the table is written to it, and if
+    *use_existing* is `True` and *corrfile* already exists then it is
+    read rather than recomputed.
+
+    Returns a data frame with the columns *group*, *replicate_1*,
+    *replicate_2*, *statistic*, *method*, *correlation*, and *nsites*.
+    '''
+    if corrfile and use_existing and os.path.isfile(corrfile):
+        return pandas.read_csv(corrfile)
+
+    records = []
+    for statistic in STATISTICS:
+        matrix = siteFracSurviveMatrix(fracsurvivedir, batch, statistic)
+        groups = matrix.columns.get_level_values('group')
+        names = matrix.columns.get_level_values('name')
+        for method in METHODS:
+            corr = _corrMatrix(matrix.values, method)
+            for group in groups.unique():
+                icols = numpy.flatnonzero(groups == group)
+                for i, j in itertools.combinations(icols, 2):
+                    records.append((group, names[i], names[j], statistic,
+                                    method, corr[i, j], len(matrix)))
+    corrs = pandas.DataFrame.from_records(records, columns=['group',
+            'replicate_1', 'replicate_2', 'statistic', 'method',
+            'correlation', 'nsites'])
+    if corrfile:
+        corrs.to_csv(corrfile, index=False)
+    return corrs
+
+
+def plotReplicateCorrelations(corrs, plotfile, method='pearson'):
+    '''Plots the correlations in *corrs* for *method* to *plotfile*.
+
+    *corrs* is a data frame returned by :func:`replicateCorrelations`.
+    There is one panel per statistic, with one point per replicate pair
+    for each group.
+    '''
+    corrs = corrs[corrs['method'] == method]
+    groups = list(corrs['group'].unique())
+    statistics = list(corrs['statistic'].unique())
+    fig, axes = plt.subplots(1, len(statistics), sharey=True,
+            figsize=(3.5 * len(statistics), 0.3 * len(groups) + 1),
+            squeeze=False)
+    for ax, statistic in zip(axes[0], statistics):
+        df = corrs[corrs['statistic'] == statistic]
+        ax.plot(df['correlation'], df['group'].map(groups.index), 'o',
+                color='#1f77b4', alpha=0.7)
+        ax.set_yticks(range(len(groups)))
+        ax.set_yticklabels(groups)
+        ax.set_xlim(min(0, df['correlation'].min()), 1)
+        ax.set_xlabel('{0} correlation'.format(method))
+        ax.set_title(statistic)
+    fig.tight_layout()
+    fig.savefig(plotfile)
+    plt.close(fig)
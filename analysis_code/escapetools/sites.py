@@ -0,0 +1,115 @@
+'''Integer keys for sites in H3 numbering.
+
+Sites in H3 numbering are labels such as ``-8``, ``93A`` (an insertion
+relative to H3), or ``(HA2)46``, so tables keyed by site have string site
+columns. A site key is an integer that encodes the chain (HA1 or HA2), the
+position, and the insertion code of a site:
+
+  key = ((chain * POSITION_RANGE) + position + POSITION_OFFSET) * INSERTION_RANGE + insertion
+
+where *chain* is 0 for HA1 and 1 for HA2, and *insertion* is 0 for no
+insertion code, 1 for ``A``, 2 for ``B``, and so on. Keys sort in sequence
+order (HA1 before HA2, and ``93`` before ``93A`` before ``94``) and convert
+back to the same labels, so they can be used for joining and sorting and
+then turned back into labels for output.
+'''
+
+
+import re
+
+import numpy
+import pandas
+
+#: matches a site label in H3 numbering
+SITE_RE = re.compile(r'^(?P<ha2>\(HA2\))?(?P<position>-?\d+)'
+                     r'(?P<insertion>[A-Z]?)$')
+
+POSITION_OFFSET = 1024
+POSITION_RANGE = 2 * POSITION_OFFSET
+INSERTION_RANGE = 32
+
+#: smallest key of a site in HA2
+HA2_MIN_KEY = POSITION_RANGE * INSERTION_RANGE
+
+
+def siteKey(label):
+    '''Integer key for the site *label*.
+
+    >>> [siteKey(s) for s in ['-8', '93', '93A', '(HA2)46']]
+    [32512, 35744, 35745, 99776]
+    '''
+    m = SITE_RE.match(str(label))
+    if not m:
+        raise ValueError("invalid site {0}".format(label))
+    position = int(m.group('position'))
+    if not -POSITION_OFFSET <= position < POSITION_OFFSET:
+        raise ValueError("position of site {0} out of range".format(label))
+    chain = 1 if m.group('ha2') else 0
+    insertion = ord(m.group('insertion')) - ord('A') + 1 if \
+            m.group('insertion') else 0
+    return ((chain * POSITION_RANGE + position + POSITION_OFFSET) *
+            INSERTION_RANGE + insertion)
+
+
+def siteParts(key):
+    '''Tuple `(chain, position, insertion code)` for the site *key*.
+
+    >>> siteParts(siteKey('(HA2)46'))
+    ('HA2', 46, '')
+    >>> siteParts(siteKey('119C'))
+    ('HA1', 119, 'C')
+    '''
+    key = int(key)
+    chain, position = divmod(key // INSERTION_RANGE, POSITION_RANGE)
+    insertion = key % INSERTION_RANGE
+    return (['HA1', 'HA2'][chain], position - POSITION_OFFSET,
+            chr(ord('A') + insertion - 1) if insertion else '')
+
+
+def siteLabel(key):
+    '''Site label for the site *key*.
+
+    >>> [siteLabel(siteKey(s)) for s in ['-8', '93A', '(HA2)46']]
+    ['-8', '93A', '(HA2)46']
+    '''
+    chain, position, insertion = siteParts(key)
+    return '{0}{1}{2}'.format('(HA2)' if chain == 'HA2' else '', position,
+            insertion)
+
+
+def pymolSelection(key):
+    '''PyMOL selection of a site, using the ``HA1`` and ``HA2`` selections.
+
+    >>> pymolSelection(siteKey('(HA2)46')), pymolSelection(siteKey('93A'))
+    ('HA2 and resi 46', 'HA1 and resi 93A')
+    '''
+    chain, position, insertion = siteParts(key)
+    return '{0} and resi {1}{2}'.format(chain, position, insertion)
+
+
+def isHA2Key(keys):
+    '''Whether each of the site *keys* is in HA2.'''
+    return numpy.asarray(keys) >= HA2_MIN_KEY
+
+
+def siteKeys(labels):
+    '''Array of the integer keys of the site *labels*.
+
+    Each distinct label is only parsed once, so this is fast for columns of
+    tables that have many rows for each site.
+    '''
+    codes, uniques = pandas.factorize(pandas.Series(labels).astype(str))
+    return numpy.array([siteKey(s) for s in uniques], dtype='int64')[codes]
+
+
+def siteLabels(keys):
+    '''Array of the site labels of the integer site *keys*.'''
+    uniques, codes = numpy.unique(numpy.asarray(keys, dtype='int64'),
+            return_inverse=True)
+    return numpy.array([siteLabel(k) for k in uniques], dtype=object)[
+            codes.ravel()]
+
+
+def addSiteKeys(df, col='site', keycol='sitekey'):
+    '''Copy of the data frame *df* with the keys of *col* in *keycol*.'''
+    return df.assign(**{keycol:siteKeys(df[col])})
@@ -0,0 +1,149 @@
+'''Wright-Fisher simulations of the evolution of escape from an antibody.
+
+Many viral populations are simulated at once as one `(population, genotype)`
+array of frequencies. The genotypes are wildtype and the single amino-acid
+mutants that are fitter than wildtype in the presence of the antibody. In
+each generation, every tracked mutant arises from wildtype at rate *mutrate*,
+selection multiplies the frequencies by the fitnesses, and drift samples
+*popsize* virions from each population with a multinomial draw. Mutants at
+most as fit as wildtype cannot lead to escape, so they are not tracked.
+
+The fitness of mutant :math:`m` relative to wildtype is
+
+.. math::
+
+    w_m = \\min\\left(1, \\frac{\\pi_m}{\\pi_{\\rm{wt}}}\\right) \\times \\left(\\frac{F_m}{F_{\\rm{wt}}}\\right)^s
+
+where :math:`\\pi` are the amino-acid preferences of WSN HA at the site of
+the mutation, :math:`F_m` is the median mutation fraction surviving (not
+above average) of the antibody, and :math:`F_{\\rm{wt}}` is the fraction
+surviving of wildtype, taken to be the median of :math:`F_m` over all
+mutations. Wildtype WSN is taken to be fit in the absence of antibody, so
+the preferences only make mutations costly. The fraction surviving was
+measured at strongly neutralizing concentrations, so the exponent
+:math:`s` (*strength*) scales the selection to weaker sustained pressure.
+A population has escaped once the tracked mutants together reach
+*escapefreq*.
+'''
+
+
+import numpy
+import pandas
+
+
+class EscapeSimulator(object):
+    '''Simulates the escape of many populations from one antibody.
+
+    *table* is an ``escapetools.prefsescape.PrefsEscapeTable`` built from the
+    median files that are not above average, and *antibody* is one of its
+    antibodies. *wtfracsurvive* is :math:`F_{\\rm{wt}}`, by default the
+    median mutation fraction surviving, and *strength* is the exponent
+    :math:`s` of the antibody selection. The attributes *mutations* (a data
+    frame with the columns *site*, *wildtype*, *mutation*, and *fitness*)
+    and *fitness* describe the tracked mutants.
+    '''
+
+    def __init__(self, table, antibody, wtfracsurvive=None, strength=1):
+        df = table.df
+        df = df[(df['mutation'] != df['wildtype']) &
+                df['preference'].notnull() & df[antibody].notnull()]
+        if wtfracsurvive is None:
+            wtfracsurvive = df[antibody].median()
+        self.antibody = antibody
+        self.wtfracsurvive = wtfracsurvive
+        self.strength = strength
+        fitness = ((df['preference'] / df['wildtypepreference']).clip(upper=1) *
+                   (df[antibody] / wtfracsurvive)**strength)
+        self.mutations = (df[['site', 'wildtype', 'mutation']]
+                          .assign(fitness=fitness.values)
+                          .loc[fitness.values > 1]
+                          .sort_values('fitness', ascending=False,
+                                       kind='mergesort')
+                          .reset_index(drop=True)
+                          )
+        self.fitness = self.mutations['fitness'].values
+
+    def simulate(self, npopulations=1000, popsize=100000, mutrate=1e-5,
+            ngenerations=200, escapefreq=0.5, seed=0):
+        '''Simulates *npopulations* populations of *popsize* virions.
+
+        *mutrate* is the rate per generation at which wildtype mutates to
+        each single amino-acid mutant, so *mutrate* times the number of
+        tracked mutants must be less than one. Populations start as all
+        wildtype and are simulated for up to *ngenerations*. Returns a data
+        frame with one row per *population* giving the *generation* at which
+        it escaped (`NaN` if it did not) and the most frequent
+        *escapemutation* then.
+        '''
+        nmut = len(self.fitness)
+        if mutrate * nmut >= 1:
+            raise ValueError("mutrate {0} times {1} tracked mutants is not "
+                    "less than one, so wildtype would have a negative "
+                    "frequency".format(mutrate, nmut))
+        rng = numpy.random.default_rng(seed)
+        fitness = numpy.concatenate([[1.0], self.fitness])
+        freqs = numpy.zeros((npopulations, nmut + 1))
+        freqs[ : , 0] = 1
+        escapegen = numpy.full(npopulations, numpy.nan)
+        escapemut = numpy.full(npopulations, -1)
+        if nmut == 0:
+            return self._results(escapegen, escapemut)
+        for generation in range(1, ngenerations + 1):
+            active = numpy.isnan(escapegen)
+            if not active.any():
+                break
+            x = freqs[active]
+            # mutation from wildtype to every tracked mutant
+            x[ : , 1 : ] += mutrate * x[ : , : 1]
+            x[ : , 0] *= 1 - mutrate * nmut
+            # selection
+            x *= fitness
+            x /= x.sum(axis=1, keepdims=True)
+            # drift
+            x = rng.multinomial(popsize, x) / float(popsize)
+            freqs[active] = x
+            escaped = x[ : , 1 : ].sum(axis=1) >= escapefreq
+            iescaped = numpy.flatnonzero(active)[escaped]
+            escapegen[iescaped] = generation
+            escapemut[iescaped] = x[escaped, 1 : ].argmax(axis=1)
+        return self._results(escapegen, escapemut)
+
+    def _results(self, escapegen, escapemut):
+        mutations = (self.mutations['wildtype'] + self.mutations['site'] +
+                     self.mutations['mutation']).values
+        return pandas.DataFrame({
+                'population':numpy.arange(len(escapegen)),
+                'generation':escapegen,
+                'escapemutation':numpy.where(escapemut >= 0,
+                        mutations[numpy.maximum(escapemut, 0)]
+                        if len(mutations) else '', ''),
+                })
+
+
+def escapeTimeSummary(results, quantiles=(0.1, 0.5, 0.9)):
+    '''Summary of the times to escape from a dict of simulation results.
+
+    *results* is keyed by antibody with data frames from
+    :meth:`EscapeSimulator.simulate`. Returns a data frame with one row per
+    antibody giving the fraction of populations that escaped, quantiles of
+    the generation of escape over all populations (`NaN` if fewer escaped),
+    and the most common escape mutation.
+    '''
+    rows = []
+    for antibody, df in results.items():
+        # populations that did not escape count as escaping after the end
+        times = numpy.sort(df['generation'].fillna(numpy.inf).values)
+        row = {'antibody':antibody,
+               'fracescaped':df['generation'].notnull().mean(),
+               'topescapemutation':(df.loc[df['generation'].notnull(),
+                       'escapemutation'].mode().iloc[0]
+                       if df['generation'].notnull().any() else ''),
+               }
+        for q in quantiles:
+            t = times[int(q * (len(times) - 1))]
+            row['generation_q{0:g}'.format(100 * q)] = (t if numpy.isfinite(t)
+                    else numpy.nan)
+        rows.append(row)
+    return pandas.DataFrame(rows, columns=['antibody', 'fracescaped'] +
+            ['generation_q{0:g}'.format(100 * q) for q in quantiles] +
+            ['topescapemutation'])
@@ -0,0 +1,77 @@
+'''Tests of ``escapetools.cocktail``.'''
+
+
+import tracemalloc
+
+import numpy
+import pandas
+import pytest
+
+from escapetools.countarrays import AAS
+from escapetools.cocktail import CocktailPredictor
+
+
+def _predictor(nantibodies=12, nsites=500, seed=1):
+    rng = numpy.random.default_rng(seed)
+    sites = numpy.repeat(numpy.arange(1, nsites + 1).astype(str), len(AAS))
+    tables = {}
+    for i in range(nantibodies):
+        tables['Ab{0}'.format(i)] = pandas.DataFrame({
+                'site':sites,
+                'wildtype':'A',
+                'mutation':numpy.tile(AAS, nsites),
+                'mutfracsurvive':rng.uniform(1e-4, 0.5, len(sites)),
+                })
+    return CocktailPredictor(tables)
+
+
+def _peakBytes(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('k', [2, 4])
+def test_singles_memory_bound(k):
+    predictor = _predictor()
+    maxbytes = 5e6
+    # allow for the small per-chunk result frames
+    assert _peakBytes(predictor.singles, k, maxbytes=maxbytes) < 1.2 * maxbytes
+
+
+@pytest.mark.parametrize('k', [2, 4])
+def test_doubles_memory_bound(k):
+    predictor = _predictor()
+    maxbytes = 2e6
+    # plus the (antibody, pair) array of the candidate pairs
+    assert (_peakBytes(predictor.doubles, k, ncandidates=100,
+            maxbytes=maxbytes) < 1.2 * maxbytes +
+            predictor.logfracsurvive.shape[0] * 100 * 99 / 2 * 8)
+
+
+def test_singles_independent_of_chunking():
+    predictor = _predictor(nantibodies=6)
+    small = predictor.singles(3, maxbytes=1e5)
+    large = predictor.singles(3)
+    pandas.testing.assert_frame_equal(small, large)
+    # brute-force product for one cocktail
+    f = numpy.exp(predictor.logfracsurvive[[0, 1, 2]].sum(axis=0))
+    row = small.set_index('cocktail').loc['Ab0+Ab1+Ab2']
+    assert numpy.isclose(row['maxfracsurvive'], f.max())
+    assert numpy.isclose(row['meanfracsurvive'], f.mean())
+
+
+def test_stop_codons_are_ignored():
+    tables = {'Ab':pandas.DataFrame({
+            'site':['1', '2', '2'],
+            'wildtype':['A', 'C', 'C'],
+            'mutation':['Y', 'D', '*'],
+            'mutfracsurvive':[0.1, 0.2, 0.9],
+            })}
+    predictor = CocktailPredictor(tables)
+    assert list(predictor.mutations['mutation']) == ['Y', 'D']
+    numpy.testing.assert_allclose(numpy.exp(predictor.logfracsurvive[0]),
+            [0.1, 0.2])
@@ -0,0 +1,68 @@
+'''Tests of ``escapetools.countarrays`` against the ``dms2`` outputs.'''
+
+
+import os
+
+import numpy
+import pandas
+
+from escapetools.countarrays import (CodonCounts, computeFracSurvive,
+        mutFracSurviveFrame, siteFracSurviveFrame)
+from escapetools.sites import siteKeys
+
+RESULTSDIR = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'results')
+
+# one row of the notebook's fracsurvivebatch
+SEL = 'L1-C179-1ug-ml-r1'
+MOCK = 'L1-mock-r1-B'
+ERR = 'WTplasmid'
+LIBFRACSURVIVE = 0.00941
+PREFIX = os.path.join(RESULTSDIR, 'fracsurvive', 'C179-1ug-ml-replicate-1a_')
+
+
+def _fracsurvive():
+    counts = CodonCounts.fromDir(os.path.join(RESULTSDIR, 'renumberedcounts'),
+            samples=[SEL, MOCK, ERR])
+    return counts, computeFracSurvive(counts, SEL, MOCK, ERR, LIBFRACSURVIVE)
+
+
+def test_mutFracSurviveFrame_matches_dms2():
+    counts, f = _fracsurvive()
+    df = mutFracSurviveFrame(counts.sites, counts.wildtypeAA(), f)
+    expected = pandas.read_csv(PREFIX + 'mutfracsurvive.csv',
+            dtype={'site':str})
+    assert len(df) == len(expected)
+    merged = expected.merge(df, on=['site', 'wildtype', 'mutation'],
+            how='outer', indicator=True, suffixes=('_dms2', ''))
+    assert (merged['_merge'] == 'both').all()
+    numpy.testing.assert_allclose(merged['mutfracsurvive'],
+            merged['mutfracsurvive_dms2'], rtol=1e-10)
+    assert (df['sitekey'].values == siteKeys(df['site'])).all()
+
+
+def test_siteFracSurviveFrame_matches_dms2():
+    counts, f = _fracsurvive()
+    df = siteFracSurviveFrame(counts.sites, counts.wildtypeAA(), f)
+    expected = pandas.read_csv(PREFIX + 'sitefracsurvive.csv',
+            dtype={'site':str})
+    assert sorted(df['site']) == sorted(expected['site'])
+    merged = expected.merge(df, on='site', suffixes=('_dms2', ''))
+    for col in ['avgfracsurvive', 'maxfracsurvive']:
+        numpy.testing.assert_allclose(merged[col], merged[col + '_dms2'],
+                rtol=1e-10)
+
+
+def test_errorCorrected_cache_checks_counts(tmpdir):
+    counts = CodonCounts.fromDir(os.path.join(RESULTSDIR, 'renumberedcounts'),
+            samples=[SEL, MOCK, ERR])
+    cachefile = str(tmpdir.join('corrected.npz'))
+    counts.errorCorrected(ERR, cachefile)
+    # same samples and sites but different counts must not hit the cache
+    changed = CodonCounts(counts.samples, counts.sites, counts.wildtype,
+            counts.counts * 2)
+    corrected = changed.errorCorrected(ERR, cachefile, use_existing=True)
+    numpy.testing.assert_allclose(corrected.counts,
+            changed.errorCorrected(ERR).counts)
+    assert (changed.errorCorrected(ERR, cachefile, use_existing=True)
+            .checksum() == corrected.checksum())
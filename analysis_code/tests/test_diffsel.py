@@ -0,0 +1,88 @@
+'''Tests of ``escapetools.diffsel``.'''
+
+
+import os
+import math
+
+import numpy
+import pandas
+
+from escapetools import diffsel
+from escapetools.countarrays import CodonCounts, CHARACTERS
+from escapetools.diffsel import mutDiffSel, mutDiffSelFrame, mutToSiteDiffSel
+
+RESULTSDIR = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'results')
+
+
+def _counts(**counts):
+    '''Amino-acid counts of one site, zero for characters not in *counts*.'''
+    return [counts.get({'*':'stop'}.get(c, c), 0) for c in CHARACTERS]
+
+
+def test_hand_computed_diffsel():
+    # site 1 has wildtype A, site 2 a wildtype stop codon and is dropped
+    sel = numpy.array([_counts(A=100, C=100), _counts(stop=50)])
+    mock = numpy.array([_counts(A=80, C=10, E=10), _counts(stop=50)])
+    wtindex = numpy.array([CHARACTERS.index('A'), CHARACTERS.index('*')])
+    s = mutDiffSel(sel, mock, wtindex)
+    # sel is twice as deep as mock, so its pseudocount is 2 * 5 = 10
+    expected = {
+            'A':0.0,
+            'C':math.log2((110 / 110) / (15 / 85)),
+            'E':math.log2((10 / 110) / (15 / 85)),
+            'D':math.log2((10 / 110) / (5 / 85)),
+            }
+    assert s[0, CHARACTERS.index('A')] == 0
+    for aa, value in expected.items():
+        numpy.testing.assert_allclose(s[0, CHARACTERS.index(aa)], value)
+    assert (s[1] == 0).all()
+
+    mutdf = mutDiffSelFrame(['1', '2'], ['A', '*'], s)
+    assert list(mutdf['site'].unique()) == ['1']
+    assert len(mutdf) == len(CHARACTERS)
+    assert mutdf.loc[mutdf['mutation'] == 'A', 'mutdiffsel'].item() == 0
+    # the stop codon and 17 other characters are like D
+    nlikeD = len(CHARACTERS) - 3
+    sitedf = mutToSiteDiffSel(mutdf)
+    assert len(sitedf) == 1
+    numpy.testing.assert_allclose(sitedf.loc[0, 'positive_diffsel'],
+            expected['C'] + nlikeD * expected['D'])
+    numpy.testing.assert_allclose(sitedf.loc[0, 'negative_diffsel'],
+            expected['E'])
+    numpy.testing.assert_allclose(sitedf.loc[0, 'abs_diffsel'],
+            expected['C'] + nlikeD * expected['D'] - expected['E'])
+    numpy.testing.assert_allclose(sitedf.loc[0, 'max_diffsel'], expected['C'])
+    numpy.testing.assert_allclose(sitedf.loc[0, 'min_diffsel'], expected['E'])
+
+
+def test_diffselBatch_use_existing_reproduces_summaries(tmpdir, monkeypatch):
+    samples = ['L1-C179-1ug-ml-r1', 'L1-C179-1ug-ml-r2', 'L1-mock-r1-B',
+               'WTplasmid']
+    counts = CodonCounts.fromDir(os.path.join(RESULTSDIR, 'renumberedcounts'),
+            samples=samples).errorCorrected('WTplasmid')
+    aacounts = counts.aaCounts()
+    batch = pandas.DataFrame({
+            'group':['C179', 'C179'],
+            'name':['r1', 'r2'],
+            'sel':samples[ : 2],
+            'mock':['L1-mock-r1-B', 'L1-mock-r1-B'],
+            })
+    outdir = str(tmpdir)
+    diffsel.diffselBatch(counts, aacounts, batch, outdir)
+    summaries = sorted(f for f in os.listdir(outdir) if
+            f.startswith('summary_'))
+    assert len(summaries) == 4
+    first = dict((f, pandas.read_csv(os.path.join(outdir, f))) for f in
+            summaries)
+    for f in summaries:
+        os.remove(os.path.join(outdir, f))
+
+    # the per-replicate files must be read rather than recomputed
+    def fail(*args, **kwargs):
+        raise AssertionError('recomputed differential selection')
+    monkeypatch.setattr(diffsel, 'mutDiffSel', fail)
+    diffsel.diffselBatch(counts, aacounts, batch, outdir, use_existing=True)
+    for f in summaries:
+        pandas.testing.assert_frame_equal(
+                pandas.read_csv(os.path.join(outdir, f)), first[f])
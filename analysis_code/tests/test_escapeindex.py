@@ -0,0 +1,19 @@
+'''Tests of ``escapetools.escapeindex``.'''
+
+
+import pandas
+
+from escapetools.escapeindex import MutEscapeIndex
+from escapetools.sites import isHA2Key
+
+
+def test_topk_in_region():
+    index = MutEscapeIndex({'Ab':pandas.DataFrame({
+            'site':['1', '(HA2)1', '(HA2)2', '2'],
+            'wildtype':'A',
+            'mutation':'C',
+            'mutfracsurvive':[0.4, 0.1, 0.3, 0.2],
+            })})
+    assert list(index.topk('Ab', 10, sites=isHA2Key)['site']) == [
+            '(HA2)2', '(HA2)1']
+    assert list(index.topk('Ab', 1, sites=['1', '2'])['site']) == ['1']
@@ -0,0 +1,76 @@
+'''Tests of ``escapetools.escapeserver``.'''
+
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas
+import pytest
+
+from escapetools.escapeserver import EscapeStore, EscapeServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    store = EscapeStore({'median':pandas.DataFrame({
+            'antibody':['FI6v3', 'FI6v3', 'C179'],
+            'site':['280', '280', '(HA2)46'],
+            'mutation':['S', 'A', 'C'],
+            'mutfracsurvive':[0.5, 0.25, 0.125],
+            })})
+    server = EscapeServer(store, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def url(server):
+    return 'http://localhost:{0}/'.format(server.server_address[1])
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode())
+
+
+def test_query(url):
+    status, rows = _get(url + 'median?antibody=FI6v3&mutation=S')
+    assert status == 200
+    assert [row['mutfracsurvive'] for row in rows] == [0.5]
+
+
+def test_numeric_filter(url):
+    status, rows = _get(url + 'median?mutfracsurvive=0.25')
+    assert status == 200
+    assert [row['mutation'] for row in rows] == ['A']
+
+
+@pytest.mark.parametrize('query, status', [
+        ('nosuchtable?site=280', 404),
+        ('median?nosuchcolumn=1', 400),
+        ('median?mutfracsurvive=high', 400),
+        ])
+def test_bad_queries(url, query, status):
+    code, body = _get(url + query)
+    assert code == status
+    assert body['error']
+
+
+@pytest.mark.parametrize('error', [RuntimeError('broken'),
+                                   KeyError('broken')])
+def test_internal_error(server, url, monkeypatch, error):
+    def query(table, filters):
+        raise error
+    monkeypatch.setattr(server.store, 'query', query)
+    code, body = _get(url + 'median?site=280')
+    assert code == 500
+    assert 'broken' in body['error']
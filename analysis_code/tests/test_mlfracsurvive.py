@@ -0,0 +1,75 @@
+'''Tests of ``escapetools.mlfracsurvive``.'''
+
+
+import os
+
+import numpy
+
+from escapetools.countarrays import (CodonCounts, computeFracSurvive,
+        codingSites, CHARACTERS)
+from escapetools.mlfracsurvive import (pseudocounted, fitEnrichment,
+        sandwichCovariance, pooledFracSurvive)
+
+RESULTSDIR = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'results')
+
+# one row of the notebook's fracsurvivebatch, as in test_countarrays
+SEL = 'L1-C179-1ug-ml-r1'
+MOCK = 'L1-mock-r1-B'
+ERR = 'WTplasmid'
+LIBFRACSURVIVE = 0.00941
+
+
+def test_one_replicate_matches_computeFracSurvive():
+    counts = CodonCounts.fromDir(os.path.join(RESULTSDIR, 'renumberedcounts'),
+            samples=[SEL, MOCK, ERR])
+    aacounts = counts.errorCorrected(ERR).aaCounts()
+    wtindex = numpy.array([CHARACTERS.index(c) for c in counts.wildtypeAA()])
+    fracsurvive, se = pooledFracSurvive(aacounts[counts.index([SEL])],
+            aacounts[counts.index([MOCK])], [LIBFRACSURVIVE], wtindex)
+    keep = codingSites(counts.wildtypeAA())
+    numpy.testing.assert_allclose(fracsurvive[keep],
+            computeFracSurvive(counts, SEL, MOCK, ERR, LIBFRACSURVIVE)[keep],
+            rtol=1e-12)
+    assert numpy.isnan(se).all()
+
+
+def _counts(seed, nsample=3, nsite=4):
+    random = numpy.random.RandomState(seed)
+    sel = random.poisson(20, (nsample, nsite, len(CHARACTERS)))
+    mock = random.poisson(20, (nsample, nsite, len(CHARACTERS)))
+    wtindex = random.randint(len(CHARACTERS), size=nsite)
+    isite = numpy.arange(nsite)
+    sel[ : , isite, wtindex] = 5000
+    mock[ : , isite, wtindex] = 5000
+    return sel, mock, wtindex
+
+
+def test_sandwichCovariance_is_nan_for_one_sample():
+    sel, mock, wtindex = _counts(1, nsample=1)
+    sel, q = pseudocounted(sel, mock)
+    beta, cov, _ = fitEnrichment(sel, q, wtindex)
+    assert numpy.isfinite(cov).all()
+    robustcov = sandwichCovariance(sel, q, beta, cov)
+    assert robustcov.shape == cov.shape
+    assert numpy.isnan(robustcov).all()
+
+
+def test_zero_count_mutations_converge():
+    sel, mock, wtindex = _counts(2)
+    # never seen in any selected sample, and at one site not in the mocks
+    sel[ : , 0, : ] = 0
+    sel[ : , 0, wtindex[0]] = 5000
+    mock[ : , 1, : ] = 0
+    mock[ : , 1, wtindex[1]] = 5000
+    sel[ : , 1, : ] = 0
+    sel[ : , 1, wtindex[1]] = 5000
+    p, q = pseudocounted(sel, mock)
+    beta, cov, niter = fitEnrichment(p, q, wtindex)
+    assert niter < 100
+    assert numpy.isfinite(beta).all() and numpy.isfinite(cov).all()
+    fracsurvive, se = pooledFracSurvive(sel, mock, [0.01] * 3, wtindex)
+    assert numpy.isfinite(fracsurvive).all() and numpy.isfinite(se).all()
+    # the unseen mutations are estimated below the library fraction surviving
+    nonwt = numpy.arange(len(CHARACTERS)) != wtindex[0]
+    assert (fracsurvive[0, nonwt] < 0.01).all()
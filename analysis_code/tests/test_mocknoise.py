@@ -0,0 +1,45 @@
+'''Tests of ``escapetools.mocknoise``.'''
+
+
+import os
+
+import numpy
+import pandas
+
+from escapetools.countarrays import CodonCounts
+from escapetools.mocknoise import mockNoise, noiseFloor, aboveNoiseFloor
+from escapetools.sites import siteKeys
+
+RESULTSDIR = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'results')
+
+MOCKS = ['L1-mock-r1-A', 'L1-mock-r1-B', 'L1-mock-r2-A', 'L1-mock-r2-B']
+LIBFRACSURVIVE = 0.00941
+
+
+def _floor():
+    counts = CodonCounts.fromDir(os.path.join(RESULTSDIR, 'renumberedcounts'),
+            samples=MOCKS)
+    noise = mockNoise(counts, counts.aaCounts())
+    assert (noise['sitekey'].values == siteKeys(noise['site'])).all()
+    return noiseFloor(noise)
+
+
+def test_aboveNoiseFloor_joins_on_site_keys():
+    floor = _floor()
+    mutfracsurvive = pandas.read_csv(os.path.join(RESULTSDIR, 'fracsurvive',
+            'C179-1ug-ml-replicate-1a_mutfracsurvive.csv'), dtype={'site':str})
+    df = aboveNoiseFloor(mutfracsurvive, LIBFRACSURVIVE, floor)
+    assert len(df) == len(mutfracsurvive)
+    assert df['foldfloor'].notnull().any()
+    # integer site labels, as read from a file without HA2 sites or
+    # insertions, join the same way
+    numeric = mutfracsurvive['site'].str.match(r'^-?\d+$')
+    intsites = aboveNoiseFloor(mutfracsurvive[numeric].assign(
+            site=mutfracsurvive['site'][numeric].astype(int)),
+            LIBFRACSURVIVE, floor)
+    expected = df[numeric]
+    numpy.testing.assert_array_equal(intsites['foldfloor'].values,
+            expected['foldfloor'].values)
+    numpy.testing.assert_array_equal(intsites['abovenoise'].values,
+            expected['abovenoise'].values)
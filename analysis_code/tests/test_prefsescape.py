@@ -0,0 +1,56 @@
+'''Tests of ``escapetools.prefsescape``.'''
+
+
+import pandas
+
+from escapetools.prefsescape import PrefsEscapeTable, AAS
+
+
+def _table():
+    prefs = pandas.DataFrame(dict([('site', ['1', '2', '(HA2)1'])] +
+            [(aa, 0.05) for aa in AAS]))
+    escape = {}
+    for ab in ['Ab1', 'Ab2']:
+        escape[ab] = pandas.DataFrame({
+                'site':['1', '1', '(HA2)1'],
+                'wildtype':['A', 'A', 'C'],
+                'mutation':['C', 'D', 'E'],
+                'mutfracsurvive':[0.1, 0.2, 0.3],
+                })
+    return PrefsEscapeTable(prefs, escape)
+
+
+def test_load_reads_saved_table(tmpdir):
+    cachefile = str(tmpdir.join('table.csv'))
+    table = _table()
+    table.save(cachefile)
+    loaded = PrefsEscapeTable.load(cachefile)
+    assert loaded.antibodies == ['Ab1', 'Ab2']
+    assert list(loaded.df.columns) == list(table.df.columns)
+    for col in ['sitekey', 'Ab1', 'Ab2']:
+        pandas.testing.assert_series_equal(loaded.df[col], table.df[col])
+
+
+def test_load_reads_table_without_site_keys(tmpdir):
+    cachefile = str(tmpdir.join('table.csv'))
+    table = _table()
+    table.df.drop(columns='sitekey').to_csv(cachefile, index=False)
+    loaded = PrefsEscapeTable.load(cachefile)
+    assert loaded.antibodies == ['Ab1', 'Ab2']
+    assert list(loaded.df.columns) == list(table.df.columns)
+    for col in ['sitekey', 'Ab1', 'Ab2']:
+        pandas.testing.assert_series_equal(loaded.df[col], table.df[col])
+
+
+def test_stop_codons_are_ignored():
+    prefs = pandas.DataFrame(dict([('site', ['1', '2'])] +
+            [(aa, 0.05) for aa in AAS]))
+    escape = {'Ab':pandas.DataFrame({
+            'site':['1', '1', '2'],
+            'wildtype':['A', 'A', 'C'],
+            'mutation':['Y', '*', 'D'],
+            'mutfracsurvive':[0.1, 0.9, 0.3],
+            })}
+    df = PrefsEscapeTable(prefs, escape).df.set_index(['site', 'mutation'])
+    assert df.at[('1', 'Y'), 'Ab'] == 0.1
+    assert df['Ab'].notnull().sum() == 2
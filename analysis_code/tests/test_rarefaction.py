@@ -0,0 +1,33 @@
+'''Tests of ``escapetools.rarefaction``.'''
+
+
+import numpy
+import pandas
+
+from escapetools.rarefaction import depthSufficiency
+
+
+def _rarefaction(sitecorrs, depths=(1000, 2000, 5000, 10000), seldepth=8000):
+    return pandas.DataFrame({
+            'group':'g',
+            'name':'r1',
+            'depth':list(depths),
+            'draw':0,
+            'seldepth':seldepth,
+            'sitecorr':sitecorrs,
+            'topsiteoverlap':1.0,
+            })
+
+
+def test_stable_depth_is_not_a_noise_hit():
+    # stable at 1000 by chance, then unstable at 2000, then stable
+    df = depthSufficiency(_rarefaction([0.99, 0.9, 0.985, 0.999]))
+    assert df['sufficientdepth'].tolist() == [5000]
+    assert df['sitecorr'].tolist() == [0.985]
+
+
+def test_unstable_below_actual_depth():
+    # depths at or above the actual depth are ignored
+    df = depthSufficiency(_rarefaction([0.99, 0.99, 0.9, 0.999]))
+    assert numpy.isnan(df['sufficientdepth'].iloc[0])
+    assert df['seldepth'].tolist() == [8000]
@@ -0,0 +1,42 @@
+'''Tests of ``escapetools.wrightfisher``.'''
+
+
+import collections
+
+import numpy
+import pandas
+import pytest
+
+from escapetools.wrightfisher import EscapeSimulator
+
+# stands in for an ``escapetools.prefsescape.PrefsEscapeTable``
+Table = collections.namedtuple('Table', ['df'])
+
+
+def _simulator(nmut=50, strength=1):
+    df = pandas.DataFrame({
+            'site':[str(i) for i in range(nmut + 1)],
+            'wildtype':'A',
+            'mutation':['A'] + ['C'] * nmut,
+            'preference':0.5,
+            'wildtypepreference':0.5,
+            'Ab':[0.01] + list(numpy.linspace(0.02, 0.5, nmut)),
+            })
+    return EscapeSimulator(Table(df), 'Ab', wtfracsurvive=0.01,
+            strength=strength)
+
+
+def test_simulate_rejects_too_high_mutrate():
+    simulator = _simulator()
+    with pytest.raises(ValueError):
+        simulator.simulate(npopulations=2, mutrate=1.0 / 50)
+
+
+def test_stronger_selection_escapes_sooner():
+    weak = _simulator(strength=0.25).simulate(npopulations=50, popsize=1000,
+            mutrate=1e-4, ngenerations=200)
+    strong = _simulator(strength=1).simulate(npopulations=50, popsize=1000,
+            mutrate=1e-4, ngenerations=200)
+    assert strong['generation'].notnull().all()
+    assert (strong['generation'].median() <
+            weak['generation'].fillna(numpy.inf).median())
@@ -0,0 +1,140 @@
+'''Long-format store of neutralization data.
+
+The plate-reader data come in two wide layouts: ``<variant>_avg`` and
+``<variant>_std`` columns (as in ``20170418_FI6v3_neutralization_data.csv``),
+or one ``<variant>-<replicate>`` column per curve (as in
+``FI6v3_neutcurves.csv``). A :class:`NeutData` holds either in a single long
+table with the columns *antibody*, *variant*, *replicate*, *concentration*,
+*fracinfectivity*, and optionally *stdev*, indexed by antibody and variant so
+that the curves for one variant can be pulled out without touching the rest.
+
+:meth:`NeutData.avgStd` returns the layout taken by the
+``PlotNeutralizationCurves`` function in the notebooks, and
+:meth:`NeutData.replicateCurves` returns the layout taken by
+``dms_tools2.neutcurve.fit_fourParamLogistics``.
+'''
+
+
+import pandas
+
+LONG_COLS = ['antibody', 'variant', 'replicate', 'concentration',
+             'fracinfectivity']
+
+#: `replicate` value for rows that are averages over replicates
+AVG_REPLICATE = 'avg'
+
+
+def readAvgStd(csvfile, antibody):
+    '''Reads a table of ``<variant>_avg`` / ``<variant>_std`` columns.
+
+    The first column of *csvfile* gives the concentrations. The returned
+    long-format data frame has *replicate* set to `AVG_REPLICATE` and the
+    standard deviations in a *stdev* column.
+    '''
+    df = pandas.read_csv(csvfile)
+    concentration = df.columns[0]
+    variants = [c[ : -len('_avg')] for c in df.columns if c.endswith('_avg')]
+    return pandas.concat([
+            pandas.DataFrame({
+                    'antibody':antibody,
+                    'variant':v,
+                    'replicate':AVG_REPLICATE,
+                    'concentration':df[concentration],
+                    'fracinfectivity':df[v + '_avg'],
+                    'stdev':df[v + '_std'],
+                    })
+            for v in variants], ignore_index=True)
+
+
+def readReplicates(csvfile, antibody):
+    '''Reads a table with a *concentration* column and ``<variant>-<replicate>``
+    columns into long format.'''
+    df = (pandas.read_csv(csvfile)
+          .melt(id_vars='concentration', var_name='curve',
+                value_name='fracinfectivity')
+          )
+    split = df['curve'].str.rsplit('-', n=1, expand=True)
+    return (df.assign(antibody=antibody, variant=split[0], replicate=split[1])
+            [LONG_COLS])
+
+
+class NeutData(object):
+    '''Neutralization data in long format indexed by antibody and variant.
+
+    *df* is a data frame with the columns in `LONG_COLS`, and optionally a
+    *stdev* column.
+    '''
+
+    def __init__(self, df):
+        missing = set(LONG_COLS) - set(df.columns)
+        assert not missing, "missing columns: {0}".format(missing)
+        df = df.copy()
+        if 'stdev' not in df.columns:
+            df['stdev'] = float('nan')
+        df['replicate'] = df['replicate'].astype(str)
+        self._df = (df[LONG_COLS + ['stdev']]
+                    .set_index(['antibody', 'variant'])
+                    .sort_index()
+                    )
+
+    @classmethod
+    def fromCSV(cls, csvfile):
+        '''Reads a long-format CSV such as ``FI6v3_neutcurves_long.csv``.'''
+        return cls(pandas.read_csv(csvfile))
+
+    def toCSV(self, csvfile):
+        '''Writes the data to *csvfile* in long format.'''
+        self._df.reset_index().to_csv(csvfile, index=False)
+
+    def antibodies(self):
+        '''List of antibodies in the data.'''
+        return list(self._df.index.get_level_values('antibody').unique())
+
+    def variants(self, antibody):
+        '''List of variants for *antibody*.'''
+        return list(self._df.loc[antibody].index.unique())
+
+    def curves(self, antibody, variants=None):
+        '''Long-format data frame for *variants* (all if `None`) of *antibody*.'''
+        if variants is None:
+            variants = self.variants(antibody)
+        return (self._df.loc[[(antibody, v) for v in variants]]
+                .reset_index())
+
+    def avgStd(self, antibody, variants=None):
+        '''Wide data frame with ``<variant>_avg`` and ``<variant>_std`` columns.
+
+        The concentrations are in a *concentration* column. Variants with
+        individual replicates are averaged over them, variants that were
+        stored as averages keep their stored standard deviations.
+        '''
+        df = self.curves(antibody, variants)
+        stats = []
+        for variant, vdf in df.groupby('variant', sort=False):
+            if (vdf['replicate'] == AVG_REPLICATE).all():
+                vstats = vdf.set_index('concentration')[
+                        ['fracinfectivity', 'stdev']]
+            else:
+                vstats = (vdf.groupby('concentration')['fracinfectivity']
+                          .agg(['mean', 'std'])
+                          .rename(columns={'mean':'fracinfectivity',
+                                           'std':'stdev'})
+                          )
+            stats.append(vstats.rename(columns={
+                    'fracinfectivity':variant + '_avg',
+                    'stdev':variant + '_std'}))
+        return (pandas.concat(stats, axis=1)
+                .rename_axis('concentration')
+                .reset_index()
+                )
+
+    def replicateCurves(self, antibody, variants=None):
+        '''Wide data frame with a *concentration* column and one
+        ``<variant>-<replicate>`` column per curve.'''
+        df = self.curves(antibody, variants)
+        df['curve'] = df['variant'] + '-' + df['replicate']
+        return (df.pivot(index='concentration', columns='curve',
+                         values='fracinfectivity')
+                .rename_axis(None, axis=1)
+                .reset_index()
+                )
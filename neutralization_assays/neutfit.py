@@ -0,0 +1,159 @@
+'''Fits neutralization curves with parameters shared across replicates.
+
+Each curve is a four-parameter logistic
+
+.. math::
+
+    f(c) = b + \\frac{t - b}{1 + (c / m)^s}
+
+with top *t*, bottom *b*, slope *s*, and midpoint *m*. In
+:func:`fitSharedReplicates` all replicates of a variant share *t*, *b*,
+and *s* while each replicate has its own *m*. The wildtype variant is fit
+first and its parameters are the starting point for every other variant,
+so flat or noisy curves start near a sensible solution rather than at
+arbitrary defaults. The fit is done in log-midpoint space with bounds, so
+it cannot run off to infinite midpoints on curves that never drop.
+'''
+
+
+import math
+import numpy
+import scipy.optimize
+
+
+class SharedCurve(object):
+    '''Fitted curve for one replicate of a variant.
+
+    Has the attributes *top*, *bottom*, *slope*, and *midpoint*, and *nfev*
+    which is the number of function evaluations used to fit its variant.
+    '''
+
+    def __init__(self, top, bottom, slope, midpoint, nfev):
+        self.top = top
+        self.bottom = bottom
+        self.slope = slope
+        self.midpoint = midpoint
+        self.nfev = nfev
+
+    def fracinfectivity(self, c):
+        '''Fraction infectivity at concentration(s) *c*.'''
+        return logistic(numpy.asarray(c, dtype='float'), self.top,
+                self.bottom, self.slope, self.midpoint)
+
+    def ic50(self):
+        '''Concentration giving 0.5 fraction infectivity, `nan` if never reached.'''
+        if not (self.bottom < 0.5 < self.top):
+            return float('nan')
+        return self.midpoint * ((self.top - self.bottom) /
+                (0.5 - self.bottom) - 1) ** (1.0 / self.slope)
+
+
+def logistic(c, top, bottom, slope, midpoint):
+    '''Four-parameter logistic curve evaluated at *c*.'''
+    return bottom + (top - bottom) / (1 + (c / midpoint) ** slope)
+
+
+def _initialMidpoint(c, f):
+    '''Concentration at which *f* first drops to 0.5, by log interpolation.'''
+    order = numpy.argsort(c)
+    c, f = c[order], f[order]
+    below = numpy.flatnonzero(f <= 0.5)
+    if len(below) == 0:
+        return c[-1]
+    i = below[0]
+    if i == 0:
+        return c[0]
+    frac = (f[i - 1] - 0.5) / (f[i - 1] - f[i])
+    return math.exp(math.log(c[i - 1]) + frac * math.log(c[i] / c[i - 1]))
+
+
+def _fitVariant(curves, start, fixtop, fixbottom, midpoint_range):
+    '''Fits the replicate *curves* of one variant.
+
+    *curves* is a list of `(concentrations, fracinfectivities)` arrays and
+    *start* is the initial `(top, bottom, slope)`. Returns the fitted
+    `(top, bottom, slope)`, the list of midpoints, and the number of
+    function evaluations.
+    '''
+    c = numpy.concatenate([ci for ci, _ in curves])
+    f = numpy.concatenate([fi for _, fi in curves])
+    curve_index = numpy.concatenate([numpy.full(len(ci), i)
+            for i, (ci, _) in enumerate(curves)])
+    logm0 = numpy.log([_initialMidpoint(ci, fi) for ci, fi in curves])
+    logmin, logmax = numpy.log(midpoint_range)
+    logm0 = numpy.clip(logm0, logmin, logmax)
+
+    top, bottom, slope = start
+    free = [(p is None) for p in (fixtop, fixbottom)]
+
+    def unpack(x):
+        i = 0
+        if free[0]:
+            t = x[i]
+            i += 1
+        else:
+            t = fixtop
+        if free[1]:
+            b = x[i]
+            i += 1
+        else:
+            b = fixbottom
+        return t, b, x[i], x[i + 1 : ]
+
+    def residuals(x):
+        t, b, s, logm = unpack(x)
+        return logistic(c, t, b, s, numpy.exp(logm[curve_index])) - f
+
+    x0 = ([top] if free[0] else []) + ([bottom] if free[1] else []) + \
+            [slope] + list(logm0)
+    lower = ([0.0] if free[0] else []) + ([-0.5] if free[1] else []) + \
+            [1e-2] + [logmin] * len(curves)
+    upper = ([2.0] if free[0] else []) + ([0.5] if free[1] else []) + \
+            [50.0] + [logmax] * len(curves)
+    x0 = numpy.clip(x0, lower, upper)
+    result = scipy.optimize.least_squares(residuals, x0,
+            bounds=(lower, upper))
+    t, b, s, logm = unpack(result.x)
+    return (t, b, s), list(numpy.exp(logm)), result.nfev
+
+
+def fitSharedReplicates(data, wildtype='WT', fixtop=None, fixbottom=None):
+    '''Fits curves where replicates share top, bottom, and slope.
+
+    *data* is a long-format data frame with the columns *variant*,
+    *replicate*, *concentration*, and *fracinfectivity*, such as returned
+    by `neutdata.NeutData.curves`. The variant *wildtype* is fit first and
+    seeds the fits of the other variants. Set *fixtop* or *fixbottom* to
+    a number to hold that parameter constant rather than fitting it.
+
+    Returns a dict keyed by ``<variant>-<replicate>`` (the same keys as
+    ``dms_tools2.neutcurve.fit_fourParamLogistics``) with a
+    :class:`SharedCurve` for each curve.
+    '''
+    data = data.assign(replicate=data['replicate'].astype(str))
+    variants = list(data['variant'].unique())
+    if wildtype in variants:
+        variants.remove(wildtype)
+        variants.insert(0, wildtype)
+    c_all = data['concentration'].values
+    midpoint_range = (c_all.min() / 1e3, c_all.max() * 1e3)
+
+    start = (1.0 if fixtop is None else fixtop,
+             0.0 if fixbottom is None else fixbottom,
+             1.0)
+    fits = {}
+    for variant in variants:
+        vdata = data[data['variant'] == variant]
+        replicates = list(vdata['replicate'].unique())
+        curves = []
+        for r in replicates:
+            rdata = vdata[vdata['replicate'] == r]
+            curves.append((rdata['concentration'].values.astype('float'),
+                           rdata['fracinfectivity'].values.astype('float')))
+        (t, b, s), midpoints, nfev = _fitVariant(curves, start, fixtop,
+                fixbottom, midpoint_range)
+        if variant == wildtype:
+            start = (t, b, s)
+        for r, m in zip(replicates, midpoints):
+            fits['{0}-{1}'.format(variant, r)] = SharedCurve(t, b, s, m, nfev)
+    return fits
@@ -0,0 +1,164 @@
+'''Small-multiple neutralization plots for many variants at once.
+
+``PlotNeutralizationCurves`` in the notebooks makes one figure per call.
+:func:`plotNeutGrid` instead lays out one panel per variant on pages of
+*nrow* by *ncol* panels and writes them all to one multi-page PDF. The
+figure and its artists are created once and only their data are updated
+from page to page. :func:`plotNeutGrids` renders several such PDFs (for
+instance one per antibody) in parallel worker processes.
+'''
+
+
+import math
+import concurrent.futures
+
+import numpy
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_pdf import PdfPages
+
+
+def _formatAxis(ax, xlim, ylim):
+    '''Formats *ax* like the panels made by ``PlotNeutralizationCurves``.'''
+    ax.set_xscale('log')
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    for loc, spine in ax.spines.items():
+        if loc in ['left', 'bottom']:
+            spine.set_position(('outward', 4))
+        else:
+            spine.set_color('none')
+    ax.xaxis.set(ticks_position='bottom')
+    ax.yaxis.set(ticks_position='left')
+    ax.tick_params(axis='both', which='major', labelsize=8, direction='out')
+    ax.minorticks_off()
+
+
+class _Panel(object):
+    '''Reusable artists for one variant panel and its wildtype reference.'''
+
+    def __init__(self, ax, color, wtcolor, maxcurves):
+        self.ax = ax
+        self.wtpoints, = ax.plot([], [], 'o', color=wtcolor, markersize=3)
+        self.wterr = ax.add_collection(LineCollection([], colors=wtcolor,
+                linewidths=1))
+        self.points, = ax.plot([], [], 'o', color=color, markersize=3)
+        self.err = ax.add_collection(LineCollection([], colors=color,
+                linewidths=1))
+        self.wtcurve, = ax.plot([], [], '-', color=wtcolor, linewidth=1)
+        self.curves = [ax.plot([], [], '-', color=color, linewidth=1)[0]
+                       for _ in range(maxcurves)]
+        self.title = ax.set_title('', fontsize=9)
+
+    @staticmethod
+    def _errSegments(x, y, yerr):
+        yerr = numpy.nan_to_num(yerr)
+        return [[(xi, yi - ei), (xi, yi + ei)] for xi, yi, ei in zip(x, y, yerr)]
+
+    def update(self, variant, stats, wildtype, xcurve, curves, wtcurve):
+        '''Shows *variant* from the ``avgStd`` data frame *stats*.'''
+        self.ax.set_visible(True)
+        self.title.set_text(variant)
+        x = stats['concentration'].values
+        for points, err, v in [(self.points, self.err, variant),
+                               (self.wtpoints, self.wterr, wildtype)]:
+            if v is None or v + '_avg' not in stats.columns:
+                points.set_data([], [])
+                err.set_segments([])
+                continue
+            y = stats[v + '_avg'].values
+            points.set_data(x, y)
+            err.set_segments(self._errSegments(x, y, stats[v + '_std'].values))
+        self.wtcurve.set_data((xcurve, wtcurve) if wtcurve is not None
+                              else ([], []))
+        for i, line in enumerate(self.curves):
+            if i < len(curves):
+                line.set_data(xcurve, curves[i])
+            else:
+                line.set_data([], [])
+
+    def hide(self):
+        self.ax.set_visible(False)
+
+
+def plotNeutGrid(neutdata, antibody, outfile, variants=None, fits=None,
+        wildtype='WT', nrow=3, ncol=4, panelsize=(2.2, 1.8),
+        color='#1f77b4', wtcolor='#999999', xlabel=None,
+        xlim=None, ylim=(-0.1, 1.2)):
+    '''Plots one panel per variant to the multi-page PDF *outfile*.
+
+    *neutdata* is a `neutdata.NeutData`, and *variants* are the variants of
+    *antibody* to plot (all but *wildtype* if `None`). Each panel also shows
+    *wildtype* in *wtcolor*. If *fits* is a dict as returned by
+    `neutfit.fitSharedReplicates`, the fitted curve for every replicate is
+    drawn too. Panels are *panelsize* inches and there are *nrow* by *ncol*
+    panels per page.
+    '''
+    if variants is None:
+        variants = [v for v in neutdata.variants(antibody) if v != wildtype]
+    plotvariants = list(variants)
+    if wildtype in neutdata.variants(antibody):
+        plotvariants.append(wildtype)
+    else:
+        wildtype = None
+    stats = neutdata.avgStd(antibody, plotvariants)
+    conc = stats['concentration'].values
+    if xlim is None:
+        xlim = (conc.min() / 2, conc.max() * 2)
+    xcurve = numpy.logspace(math.log10(xlim[0]), math.log10(xlim[1]), 100)
+
+    def fitted(v):
+        if fits is None or v is None:
+            return []
+        return [fit.fracinfectivity(xcurve) for key, fit in sorted(fits.items())
+                if key.rsplit('-', 1)[0] == v]
+
+    wtcurves = fitted(wildtype)
+    wtcurve = numpy.mean(wtcurves, axis=0) if wtcurves else None
+    curves = dict((v, fitted(v)) for v in variants)
+    maxcurves = max([len(c) for c in curves.values()] + [0])
+
+    fig = Figure(figsize=(ncol * panelsize[0], nrow * panelsize[1]))
+    axes = fig.subplots(nrow, ncol, squeeze=False).flatten()
+    panels = []
+    for ax in axes:
+        _formatAxis(ax, xlim, ylim)
+        panels.append(_Panel(ax, color, wtcolor, maxcurves))
+        panels[-1].title.set_text(wildtype or antibody) # reserve title space
+    fig.supxlabel(xlabel or '{0} ($\\mu$g/ml)'.format(antibody), fontsize=10)
+    fig.supylabel('fraction infectivity', fontsize=10)
+    fig.tight_layout()
+
+    perpage = nrow * ncol
+    with PdfPages(outfile) as pdf:
+        for start in range(0, max(len(variants), 1), perpage):
+            pagevariants = variants[start : start + perpage]
+            for i, panel in enumerate(panels):
+                if i < len(pagevariants):
+                    v = pagevariants[i]
+                    panel.update(v, stats, wildtype, xcurve, curves[v],
+                                 wtcurve)
+                else:
+                    panel.hide()
+            pdf.savefig(fig)
+
+
+def _plotNeutGridJob(job):
+    neutdata, antibody, outfile, kwargs = job
+    plotNeutGrid(neutdata, antibody, outfile, **kwargs)
+    return outfile
+
+
+def plotNeutGrids(neutdata, jobs, ncpus=1):
+    '''Runs :func:`plotNeutGrid` for each item of *jobs* using *ncpus* processes.
+
+    Each item of *jobs* is a tuple `(antibody, outfile, kwargs)` where
+    *kwargs* is a dict of keyword arguments to :func:`plotNeutGrid`.
+    Returns the list of output files.
+    '''
+    jobs = [(neutdata, antibody, outfile, kwargs)
+            for antibody, outfile, kwargs in jobs]
+    if ncpus == 1:
+        return list(map(_plotNeutGridJob, jobs))
+    with concurrent.futures.ProcessPoolExecutor(ncpus) as executor:
+        return list(executor.map(_plotNeutGridJob, jobs))
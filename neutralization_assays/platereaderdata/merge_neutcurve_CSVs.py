@@ -0,0 +1,114 @@
+'''Merges per-variant neutralization CSVs into a long-format table.
+
+Each plate-reader export is named ``<prefix>_<variant>.csv`` (for instance
+``FI6v3_K280S.csv``) and has a ``concentration`` column followed by one
+column per replicate. The rows are appended to ``<prefix>_neutcurves_long.csv``
+with the columns *antibody*, *variant*, *replicate*, *concentration*, and
+*fracinfectivity*. Variants that are already in that file are skipped, so
+re-running after adding new exports only appends the new variants.
+
+Run from this directory, for instance::
+
+    python merge_neutcurve_CSVs.py FI6v3 --wide
+
+The ``--wide`` option also writes ``<prefix>_neutcurves.csv`` with one
+``<variant>-<replicate>`` column per curve, which is the format expected by
+``dms_tools2.neutcurve.fit_fourParamLogistics``.
+
+The table is a CSV rather than a Parquet dataset so that the neutralization
+assays only need ``pandas``; the Parquet export of the deep sequencing
+results (``escapetools.parquetexport`` in ``analysis_code``) needs
+``pyarrow``.
+'''
+
+
+import os
+import re
+import glob
+import argparse
+import pandas
+
+LONG_COLS = ['antibody', 'variant', 'replicate', 'concentration',
+             'fracinfectivity']
+
+
+def variantName(csvfile, prefix):
+    '''Variant name for *csvfile* exported for antibody *prefix*.
+
+    Underscores before a subunit become dashes (``G47R_HA2`` is
+    ``G47R-HA2``), and negative site numbers are parenthesized
+    (``K-8T`` is ``K(-8T)``).
+
+    >>> variantName('FI6v3_G47R_HA2.csv', 'FI6v3')
+    'G47R-HA2'
+    >>> variantName('FI6v3_K-8T.csv', 'FI6v3')
+    'K(-8T)'
+    '''
+    variant = os.path.splitext(os.path.basename(csvfile))[0]
+    assert variant.startswith(prefix + '_'), \
+            "{0} does not start with {1}_".format(csvfile, prefix)
+    variant = variant[len(prefix) + 1 : ].replace('_', '-')
+    return re.sub(r'^([A-Z])(-\d+[A-Z])', r'\1(\2)', variant)
+
+
+def mergedVariants(longfile):
+    '''Set of variants already in *longfile* (empty if it does not exist).'''
+    if not os.path.isfile(longfile):
+        return set()
+    return set(pandas.read_csv(longfile, usecols=['variant'])['variant'])
+
+
+def appendVariant(csvfile, prefix, longfile):
+    '''Appends the curves in *csvfile* to *longfile* in long format.'''
+    df = (pandas.read_csv(csvfile)
+          .melt(id_vars='concentration', var_name='replicate',
+                value_name='fracinfectivity')
+          .assign(antibody=prefix,
+                  variant=variantName(csvfile, prefix))
+          [LONG_COLS]
+          )
+    writeheader = not os.path.isfile(longfile)
+    df.to_csv(longfile, mode='a', header=writeheader, index=False)
+
+
+def longToWide(longfile, widefile):
+    '''Writes the curves in *longfile* as ``<variant>-<replicate>`` columns.'''
+    df = pandas.read_csv(longfile)
+    df['curve'] = df['variant'] + '-' + df['replicate'].astype(str)
+    (df.pivot(index='concentration', columns='curve', values='fracinfectivity')
+       .rename_axis(None, axis=1)
+       .to_csv(widefile)
+       )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('prefix', help='antibody prefix of the CSV files')
+    parser.add_argument('--indir', default='.',
+            help='directory with the CSV files, also used for output')
+    parser.add_argument('--wide', action='store_true',
+            help='also write the wide <prefix>_neutcurves.csv')
+    args = parser.parse_args()
+
+    longfile = os.path.join(args.indir,
+            '{0}_neutcurves_long.csv'.format(args.prefix))
+    merged = mergedVariants(longfile)
+    for f in sorted(glob.glob(os.path.join(args.indir,
+            '{0}_*.csv'.format(args.prefix)))):
+        if f.endswith('_neutcurves.csv') or f.endswith('_neutcurves_long.csv'):
+            continue
+        variant = variantName(f, args.prefix)
+        if variant in merged:
+            continue
+        print("Appending {0} from {1}".format(variant, f))
+        appendVariant(f, args.prefix, longfile)
+
+    if args.wide:
+        widefile = os.path.join(args.indir,
+                '{0}_neutcurves.csv'.format(args.prefix))
+        print("Writing {0}".format(widefile))
+        longToWide(longfile, widefile)
+
+
+if __name__ == '__main__':
+    main()